@@ -49,61 +49,73 @@ const getToken = async () => {
     })
 }
 
-const getResponse = async (payload) => {
-    console.log("getResponse called with payload:", payload);
-    return new Promise(async (resolve, reject) => {
-        try {
-            // Extract data from payload
-            const question = payload.question || "";
-            const explanationLevel = payload.explanationLevel || "detailed";
-            const userRole = payload.userRole || "";
-            const additionalContext = payload.additionalContext || "";
-            
-            console.log("Making fetch request to localhost:8000/explain with params:", {
-                text: question,
-                explanationLevel: explanationLevel,
-                userRole: userRole,
-                additionalContext: additionalContext
-            });
-            
-            const res = await fetch("http://localhost:8000/explain", {
-                method: "POST",
-                headers: {
-                    "Content-Type": "application/json",
-                },
-                body: JSON.stringify({
-                    "text": question,
-                    "explanationLevel": explanationLevel,
-                    "userRole": userRole,
-                    "additionalContext": additionalContext
-                })
-            });
-            
-            console.log("Fetch response status:", res.status);
-            
-            if (!res.ok) {
-                console.error("API request failed with status:", res.status);
-                const errorText = await res.text();
-                console.error("Error response:", errorText);
-                reject("ERROR: API request failed with status " + res.status);
-                return;
-            }
-            
-            // Parse the JSON response
-            const jsonResponse = await res.json();
-            console.log("API response:", jsonResponse);
-            
-            // Send the parsed response directly
-            resolve(JSON.stringify(jsonResponse));
-        } catch (e) {
-            console.error("Exception in getResponse:", e);
-            if (e === "CLOUDFLARE") {
-                reject("CLOUDFLARE");
-            } else {
-                reject("ERROR: " + e.message);
-            }
+const parseSseEvent = (rawEvent) => {
+    let event = "message";
+    const dataLines = [];
+    rawEvent.split("\n").forEach(line => {
+        if (line.startsWith("event:")) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+            dataLines.push(line.slice(5).trim());
         }
     });
+    return { event, data: dataLines.length ? JSON.parse(dataLines.join("\n")) : {} };
+};
+
+const getStreamingResponse = async (payload, onUpdate) => {
+    console.log("getStreamingResponse called with payload:", payload);
+    const res = await fetch("http://localhost:8000/explain/stream", {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        },
+        body: JSON.stringify({
+            "text": payload.question || "",
+            "explanationLevel": payload.explanationLevel || "detailed",
+            "userRole": payload.userRole || "",
+            "additionalContext": payload.additionalContext || ""
+        })
+    });
+
+    if (!res.ok) {
+        const errorText = await res.text();
+        console.error("Streaming request failed:", res.status, errorText);
+        throw "ERROR: API request failed with status " + res.status;
+    }
+
+    // The response is rebuilt after every event so the popup can render it progressively
+    const state = { explanation: "", definitions: [], partial: true };
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const { event, data } = parseSseEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+
+            if (event === "definitions") {
+                state.definitions = data.definitions;
+            } else if (event === "token") {
+                state.explanation += data.text;
+            } else if (event === "done") {
+                state.explanation = data.explanation;
+                state.partial = false;
+                return JSON.stringify(state);
+            } else if (event === "error") {
+                throw "ERROR: " + data.detail;
+            }
+            onUpdate(JSON.stringify(state));
+        }
+    }
+    throw "ERROR: stream ended before the explanation was complete";
 };
 
 chrome.runtime.onConnect.addListener((port) => {
@@ -112,23 +124,14 @@ chrome.runtime.onConnect.addListener((port) => {
     port.onMessage.addListener((msg) => {
         console.log("Message received on port:", msg);
         
-        getResponse(msg)
+        getStreamingResponse(msg, (partialResponse) => port.postMessage(partialResponse))
             .then(jsonResponse => {
                 console.log("Sending response to popup:", jsonResponse);
-                
-                // Add a small artificial delay to ensure the loading animation is visible
-                // This can be removed in production if the API is slow enough
-                setTimeout(() => {
-                    port.postMessage(jsonResponse);
-                }, 1500); // 1.5 second delay
+                port.postMessage(jsonResponse);
             })
             .catch((error) => {
-                console.error("getResponse promise rejected:", error);
-                
-                // Add a small artificial delay for errors too
-                setTimeout(() => {
-                    port.postMessage(error);
-                }, 1500); // 1.5 second delay
+                console.error("getStreamingResponse promise rejected:", error);
+                port.postMessage(typeof error === "string" ? error : "ERROR: " + error.message);
             });
     });
     
@@ -567,6 +567,21 @@ document.addEventListener("DOMContentLoaded", async () => {
                 const jsonResponse = JSON.parse(answer);
                 console.log("Parsed JSON response:", jsonResponse);
                 
+                if (jsonResponse.partial) {
+                    // Streamed update: render what has arrived so far, history is saved for the final answer
+                    let output = `<div class="explanation">${jsonResponse.explanation || "..."}</div>`;
+                    if (jsonResponse.definitions && jsonResponse.definitions.length > 0) {
+                        output += `<div class="definitions"><h3>Definitions:</h3><ul>`;
+                        jsonResponse.definitions.forEach(def => {
+                            output += `<li><strong>${def.entity}</strong>: ${def.definition}</li>`;
+                        });
+                        output += `</ul></div>`;
+                    }
+                    outputElement.innerHTML = output;
+                    outputElement.style.opacity = 1;
+                    return;
+                }
+                
                 if (jsonResponse.explanation) {
                     console.log("Found explanation:", jsonResponse.explanation);
                     let output = `<div class="explanation">${jsonResponse.explanation}</div>`;
@@ -0,0 +1 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
\ No newline at end of file
@@ -4,7 +4,8 @@ Data is stored in a vector database and a relational database.
 The vector database is used to store the embeddings of the documents.
 The relational database is used to store the definitions of the named entities (knowledge base).
 """
-from .vector import QdrantVectorDB, DocumentChunk
+from .vector import QdrantVectorDB, DocumentChunk, VectorStore
+from .local_vector import LocalVectorDB
 from .relational import Entity
 
-__all__ = ["QdrantVectorDB", "DocumentChunk", "Entity"]
\ No newline at end of file
+__all__ = ["QdrantVectorDB", "LocalVectorDB", "VectorStore", "DocumentChunk", "Entity"]
\ No newline at end of file
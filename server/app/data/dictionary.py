@@ -0,0 +1,50 @@
+"""
+Jargon dictionary file and the command syncing it into the database.
+
+    PYTHONPATH=app python -m data.dictionary [path/to/dictionary.csv] [--prune]
+
+Only the terms that are new or whose definition changed are written, running
+servers are notified and rebuild their lookup index.
+"""
+import argparse
+import logging
+from pathlib import Path
+from typing import List, Tuple
+import pandas as pd
+
+DICTIONARY_PATH = Path(__file__).absolute().parent.parent / 'dictionary.csv'
+
+
+def read_dictionary(path: Path = DICTIONARY_PATH) -> List[Tuple[str, str | None]]:
+    """
+    Read a dictionary CSV with `Entity` and `Decription` columns.
+
+    Args:
+        path: CSV file
+
+    Returns:
+        (name, definition) pairs, names stripped, blank names dropped and the last definition of a repeated name kept
+    """
+    df = pd.read_csv(path, usecols=['Entity', 'Decription'], dtype=str, keep_default_na=False)
+    entries = {name.strip(): definition or None for name, definition in zip(df['Entity'], df['Decription'])}
+    entries.pop('', None)
+    return list(entries.items())
+
+
+def main(argv=None) -> None:
+    from .sql_client import SQLClient
+
+    parser = argparse.ArgumentParser(prog="python -m data.dictionary", description="Sync the jargon dictionary into the database.")
+    parser.add_argument("path", nargs="?", type=Path, default=DICTIONARY_PATH, help="Dictionary CSV file")
+    parser.add_argument("--prune", action="store_true", help="Delete terms missing from the file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    sql_client = SQLClient()
+    sql_client.init()
+    result = sql_client.sync_jargon(read_dictionary(args.path), prune=args.prune)
+    print(result.model_dump_json())
+
+
+if __name__ == "__main__":
+    main()
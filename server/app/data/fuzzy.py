@@ -0,0 +1,109 @@
+"""
+In-memory fuzzy index over the jargon dictionary.
+
+Mirrors the ``levenshtein(word, name) < max_distance`` lookup done in Postgres,
+but answers it from a SymSpell-style deletion index instead of scanning every row.
+"""
+from itertools import combinations
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def levenshtein(a: str, b: str, max_distance: int | None = None) -> int:
+    """
+    Compute the Levenshtein distance between two strings.
+
+    Args:
+        a: First string
+        b: Second string
+        max_distance: Stop early once the distance is known to exceed this value
+
+    Returns:
+        The edit distance, or ``max_distance + 1`` if the cut-off was hit
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def _deletes(word: str, depth: int) -> Set[str]:
+    """All strings obtained by removing up to ``depth`` characters from ``word``."""
+    variants = {word}
+    for n in range(1, min(depth, len(word)) + 1):
+        for positions in combinations(range(len(word)), n):
+            variants.add(''.join(c for i, c in enumerate(word) if i not in positions))
+    return variants
+
+
+class FuzzyIndex:
+    """Deletion index answering "distance < max_distance, closest first" lookups."""
+
+    def __init__(self, entries: Iterable[Tuple[str, str]], max_distance: int = 2):
+        """
+        Build the index.
+
+        Args:
+            entries: ``(name, definition)`` pairs, in table order
+            max_distance: Exclusive upper bound on the edit distance of a match
+        """
+        self.max_distance = max_distance
+        self._depth = max_distance - 1
+        self._entries: List[Tuple[str, str]] = []
+        self._deletions: Dict[str, List[int]] = {}
+        for name, definition in entries:
+            position = len(self._entries)
+            self._entries.append((name, definition))
+            for variant in _deletes(name, self._depth):
+                self._deletions.setdefault(variant, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def names(self) -> List[str]:
+        """Entry names, in table order."""
+        return [name for name, _ in self._entries]
+
+    def search(self, word: str) -> List[Tuple[str, str, int]]:
+        """
+        Find every entry within the distance bound.
+
+        Args:
+            word: Already normalized query word
+
+        Returns:
+            ``(name, definition, distance)`` tuples ordered by distance, then table order
+        """
+        candidates: Set[int] = set()
+        for variant in _deletes(word, self._depth):
+            candidates.update(self._deletions.get(variant, ()))
+
+        matches = []
+        for position in candidates:
+            name, definition = self._entries[position]
+            distance = levenshtein(word, name, self._depth)
+            if distance < self.max_distance:
+                matches.append((distance, position, name, definition))
+        matches.sort()
+        return [(name, definition, distance) for distance, _, name, definition in matches]
+
+    def lookup(self, word: str) -> Tuple[str, str] | None:
+        """Return the closest ``(name, definition)`` pair, or None when nothing is close enough."""
+        matches = self.search(word)
+        return None if not matches else (matches[0][0], matches[0][1])
@@ -0,0 +1,435 @@
+"""
+In-process vector store.
+
+Vectors are kept in append-only segments: a memory-mapped float32 matrix of
+normalized embeddings plus a JSON-lines file with the id and payload of every row.
+Upserting a chunk appends a new row that shadows the previous one, deletions are
+appended to a tombstone log, so nothing already written is ever rewritten.
+Search is a matrix product over the segments followed by a top-k selection,
+filters are evaluated on per-field value indexes into a row mask.
+"""
+import asyncio
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+from qdrant_client.http import models
+from data.vector import DocumentChunk, PAYLOAD_FIELDS, VectorStore, chunk_point_id, _payload_default
+
+logger = logging.getLogger(__name__)
+
+# Column of the point ids, not a payload field
+ID_KEY = "\x00id"
+
+
+class _Segment:
+    """Rows of one segment: normalized vectors on disk, ids and payloads in memory."""
+
+    def __init__(self, vectors_path: Path, payloads_path: Path, dimension: int):
+        self.vectors_path = vectors_path
+        self.payloads_path = payloads_path
+        self.dimension = dimension
+        self.ids: List[str] = []
+        self.payloads: List[Dict[str, Any]] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self._matrix: Optional[np.memmap] = None
+        # Rows holding every value of the payload fields filtered on so far
+        self._columns: Dict[str, Dict[Any, np.ndarray]] = {}
+
+        self.vectors_path.touch(exist_ok=True)
+        self.payloads_path.touch(exist_ok=True)
+        row_size = dimension * np.dtype(np.float32).itemsize
+        stored_rows = self.vectors_path.stat().st_size // row_size
+        payloads_size = 0
+        with self.payloads_path.open("rb") as f:
+            for line in f:
+                if len(self.ids) >= stored_rows or not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                self.ids.append(record.pop("id"))
+                self.payloads.append(record)
+                payloads_size += len(line)
+        # A row whose vector or payload was not fully written is dropped, so later appends stay aligned
+        with self.vectors_path.open("r+b") as f:
+            f.truncate(len(self.ids) * row_size)
+        with self.payloads_path.open("r+b") as f:
+            f.truncate(payloads_size)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None or self._matrix.shape[0] != len(self.ids):
+            if not self.ids:
+                return np.zeros((0, self.dimension), dtype=np.float32)
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dimension))
+        return self._matrix
+
+    def append(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        with self.vectors_path.open("ab") as f:
+            f.write(vectors.astype(np.float32).tobytes())
+        with self.payloads_path.open("a") as f:
+            for point_id, payload in zip(ids, payloads):
+                f.write(json.dumps({"id": point_id, **payload}, ensure_ascii=False) + "\n")
+        first_row = len(self.ids)
+        self.ids.extend(ids)
+        self.payloads.extend(payloads)
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+        for key, column in self._columns.items():
+            for value, rows in self._index(key, first_row).items():
+                column[value] = np.concatenate([column[value], rows]) if value in column else rows
+
+    def column(self, key: str) -> Dict[Any, np.ndarray]:
+        """Rows of every value of a payload field, or of the point ids for ID_KEY."""
+        if key not in self._columns:
+            self._columns[key] = self._index(key, 0)
+        return self._columns[key]
+
+    def _index(self, key: str, first_row: int) -> Dict[Any, np.ndarray]:
+        rows: Dict[Any, List[int]] = {}
+        for row in range(first_row, len(self.ids)):
+            values = [self.ids[row]] if key == ID_KEY else _payload_values(self.payloads[row], key)
+            for value in values:
+                if isinstance(value, Hashable):
+                    rows.setdefault(value, []).append(row)
+        return {value: np.asarray(value_rows, dtype=np.int64) for value, value_rows in rows.items()}
+
+    def rows_with(self, key: str, values: Iterable[Any]) -> np.ndarray:
+        """Mask of the rows having any of the values in a payload field."""
+        column = self.column(key)
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for value in values:
+            if isinstance(value, Hashable) and value in column:
+                mask[column[value]] = True
+        return mask
+
+
+class LocalVectorDB(VectorStore):
+    """Vector store living in the server process, backed by memory-mapped files."""
+
+    def __init__(self, path: str, embedding_dim: int, segment_size: int = 65536):
+        """
+        Open or create the store.
+
+        Args:
+            path: Directory holding the segment files
+            embedding_dim: Dimension of the embedding vectors
+            segment_size: Number of rows after which a new segment is started
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.embedding_dim = int(embedding_dim)
+        self.segment_size = segment_size
+        self.tombstones_path = self.path / "tombstones.txt"
+        self.tombstones_path.touch(exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        # Live row of every id
+        self._rows: Dict[str, Tuple[int, int]] = {}
+
+        number = 0
+        while (self.path / f"segment-{number:05d}.f32").exists():
+            self._segments.append(self._open_segment(number))
+            number += 1
+        self._replay()
+
+    def _open_segment(self, number: int) -> _Segment:
+        return _Segment(
+            self.path / f"segment-{number:05d}.f32",
+            self.path / f"segment-{number:05d}.jsonl",
+            self.embedding_dim
+        )
+
+    def _replay(self) -> None:
+        """Rebuild the live rows: later rows shadow earlier ones, tombstones kill the rows written before them."""
+        positions: Dict[str, List[Tuple[int, Tuple[int, int]]]] = {}
+        sequence = 0
+        for segment_number, segment in enumerate(self._segments):
+            for row, point_id in enumerate(segment.ids):
+                positions.setdefault(point_id, []).append((sequence, (segment_number, row)))
+                sequence += 1
+            segment.alive[:] = False
+
+        deleted_before: Dict[str, int] = {}
+        with self.tombstones_path.open("r") as f:
+            for line in f:
+                point_id, _, written = line.strip().rpartition(" ")
+                if point_id:
+                    deleted_before[point_id] = max(deleted_before.get(point_id, 0), int(written))
+
+        for point_id, rows in positions.items():
+            sequence, (segment_number, row) = rows[-1]
+            if sequence >= deleted_before.get(point_id, 0):
+                self._segments[segment_number].alive[row] = True
+                self._rows[point_id] = (segment_number, row)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add_documents(self, documents: List[DocumentChunk]) -> List[str]:
+        """
+        Add documents to the store, replacing chunks with the same ID.
+
+        Args:
+            documents: List of document chunks to add
+
+        Returns:
+            List of document IDs
+        """
+        ids, vectors, payloads = [], [], []
+        for i, doc in enumerate(documents):
+            if doc.embedding is None:
+                raise ValueError(f"Document {i} has no embedding")
+            ids.append(str(doc.id) if doc.id else chunk_point_id(doc.source_name, doc.text, doc.metadata))
+            vectors.append(doc.embedding)
+            payloads.append({
+                "text": doc.text,
+                "source_name": doc.source_name,
+                "chunk_id": doc.chunk_id,
+                "token_count": doc.token_count,
+                "named_entities": doc.named_entities,
+                "metadata": doc.metadata
+            })
+        if not ids:
+            return []
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32))
+        if matrix.shape[1] != self.embedding_dim:
+            raise ValueError(f"Expected embeddings of dimension {self.embedding_dim}, got {matrix.shape[1]}")
+
+        with self._lock:
+            self._append(ids, matrix, payloads)
+        return ids
+
+    def _append(self, ids: List[str], matrix: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        """Append rows shadowing the previous rows of their ids, the lock must be held."""
+        start = 0
+        while start < len(ids):
+            if not self._segments or len(self._segments[-1]) >= self.segment_size:
+                self._segments.append(self._open_segment(len(self._segments)))
+            segment_number = len(self._segments) - 1
+            segment = self._segments[segment_number]
+            end = start + min(len(ids) - start, self.segment_size - len(segment))
+            first_row = len(segment)
+            segment.append(ids[start:end], matrix[start:end], payloads[start:end])
+            for offset, point_id in enumerate(ids[start:end]):
+                self._kill(point_id)
+                self._rows[point_id] = (segment_number, first_row + offset)
+            start = end
+
+    def get_point_ids(self, source_name: str) -> Set[str]:
+        with self._lock:
+            return {
+                point_id for point_id, (segment_number, row) in self._rows.items()
+                if self._segments[segment_number].payloads[row].get("source_name") == source_name
+            }
+
+    def delete_points(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            written = sum(len(segment) for segment in self._segments)
+            with self.tombstones_path.open("a") as f:
+                for point_id in ids:
+                    f.write(f"{point_id} {written}\n")
+            for point_id in ids:
+                self._kill(str(point_id))
+
+    def set_payloads(self, payloads: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Overwrite payload fields of stored chunks.
+
+        Rows are never rewritten, a chunk whose payload changes is appended again with
+        its stored vector. Chunks whose payload already holds the values are left alone.
+
+        Args:
+            payloads: Payload fields to set, per chunk ID
+        """
+        with self._lock:
+            ids, vectors, updated = [], [], []
+            for point_id, fields in payloads.items():
+                position = self._rows.get(str(point_id))
+                if position is None:
+                    continue
+                segment_number, row = position
+                segment = self._segments[segment_number]
+                payload = {**segment.payloads[row], **fields}
+                if payload != segment.payloads[row]:
+                    ids.append(str(point_id))
+                    vectors.append(np.array(segment.matrix[row]))
+                    updated.append(payload)
+            if ids:
+                self._append(ids, np.asarray(vectors, dtype=np.float32), updated)
+
+    def _kill(self, point_id: str) -> None:
+        position = self._rows.pop(point_id, None)
+        if position is not None:
+            segment_number, row = position
+            self._segments[segment_number].alive[row] = False
+
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Search the store for similar documents.
+
+        Args:
+            query_embedding: Embedding of the query
+            limit: Maximum number of results to return
+            filter_condition: Filter to apply to the search, supports match conditions on payload fields
+            payload_fields: Payload fields to return, all of them when None
+            with_vectors: Also return the stored embeddings
+
+        Returns:
+            List of similar documents with their cosine similarity scores
+        """
+        return self.search_batch([query_embedding], limit, filter_condition, payload_fields, with_vectors)[0]
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many query embeddings with one matrix product per segment.
+
+        Args:
+            query_embeddings: Embeddings of the queries
+            limit: Maximum number of results to return per query
+            filter_condition: Filter to apply to every query
+            payload_fields: Payload fields to return, all of them when None
+            with_vectors: Also return the stored embeddings
+
+        Returns:
+            List of similar documents for each query, in query order
+        """
+        if not query_embeddings:
+            return []
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            segments = [(segment, segment.matrix, self._mask(segment, filter_condition)) for segment in self._segments]
+
+        # Best candidates of every segment, merged afterwards
+        candidates: List[List[Tuple[float, _Segment, int]]] = [[] for _ in range(len(queries))]
+        for segment, matrix, mask in segments:
+            matching = int(mask.sum())
+            if matching == 0:
+                continue
+            # Scoring every row reads the mapped matrix in place, excluded rows are ruled out afterwards
+            scores = queries @ matrix.T
+            scores[:, ~mask] = -np.inf
+            k = min(limit, matching)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for query, rows in enumerate(top):
+                candidates[query].extend((float(scores[query, row]), segment, int(row)) for row in rows)
+
+        results = []
+        for query_candidates in candidates:
+            query_candidates.sort(key=lambda candidate: -candidate[0])
+            results.append([
+                self._format(segment, row, score, payload_fields, with_vectors)
+                for score, segment, row in query_candidates[:limit]
+            ])
+        return results
+
+    async def asearch(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Async search, the scan runs in a worker thread to keep the event loop free."""
+        return await asyncio.to_thread(self.search, query_embedding, limit, filter_condition, payload_fields, with_vectors)
+
+    async def asearch_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """Async batch search, the scan runs in a worker thread to keep the event loop free."""
+        return await asyncio.to_thread(self.search_batch, query_embeddings, limit, filter_condition, payload_fields, with_vectors)
+
+    def _mask(self, segment: _Segment, filter_condition: Optional[models.Filter]) -> np.ndarray:
+        """Rows of a segment that are alive and pass the filter."""
+        mask = segment.alive.copy()
+        if filter_condition is not None:
+            mask &= _filter_mask(segment, filter_condition)
+        return mask
+
+    @staticmethod
+    def _format(segment: _Segment, row: int, score: float, payload_fields: Optional[List[str]], with_vectors: bool) -> Dict[str, Any]:
+        payload = segment.payloads[row]
+        record = {"id": segment.ids[row]}
+        for field in PAYLOAD_FIELDS if payload_fields is None else payload_fields:
+            record[field] = payload[field] if field in payload else _payload_default(field)
+        record["score"] = score
+        if with_vectors:
+            record["embedding"] = segment.matrix[row].tolist()
+        return record
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+
+def _conditions(conditions) -> Iterator:
+    if conditions is None:
+        return iter(())
+    return iter(conditions if isinstance(conditions, list) else [conditions])
+
+
+def _payload_values(payload: Dict[str, Any], key: str) -> List[Any]:
+    """Values of a possibly nested payload key, lists are flattened like Qdrant does."""
+    value: Any = payload
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return []
+        value = value[part]
+    return value if isinstance(value, list) else [value]
+
+
+def _filter_mask(segment: _Segment, condition) -> np.ndarray:
+    """Evaluate the subset of Qdrant filters used by the application against the rows of a segment."""
+    if isinstance(condition, models.Filter):
+        mask = np.ones(len(segment), dtype=bool)
+        for c in _conditions(condition.must):
+            mask &= _filter_mask(segment, c)
+        if condition.should is not None:
+            should = np.zeros(len(segment), dtype=bool)
+            for c in _conditions(condition.should):
+                should |= _filter_mask(segment, c)
+            mask &= should
+        for c in _conditions(condition.must_not):
+            mask &= ~_filter_mask(segment, c)
+        return mask
+    if isinstance(condition, models.HasIdCondition):
+        return segment.rows_with(ID_KEY, {str(i) for i in condition.has_id})
+    if isinstance(condition, models.FieldCondition):
+        match = condition.match
+        if isinstance(match, models.MatchValue):
+            return segment.rows_with(condition.key, [match.value])
+        if isinstance(match, models.MatchAny):
+            return segment.rows_with(condition.key, match.any)
+        if isinstance(match, models.MatchExcept):
+            return ~segment.rows_with(condition.key, match.except_)
+        if isinstance(match, models.MatchText):
+            column = segment.column(condition.key)
+            return segment.rows_with(condition.key, [value for value in column if isinstance(value, str) and match.text in value])
+    raise ValueError(f"Unsupported filter condition for the local vector store: {condition!r}")
@@ -2,7 +2,7 @@
 Schema for the relational database.
 """
 
-from sqlalchemy import Column, String, Integer, Text, DateTime
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index
 from sqlalchemy.orm import DeclarativeBase
 import datetime
 
@@ -21,3 +21,12 @@ class Entity(Base):
     
     def __repr__(self):
         return f"<Entity(name='{self.name}')>"
+
+
+# Trigram index used to prefilter fuzzy lookups before levenshtein() is applied (requires pg_trgm).
+entity_name_trgm_index = Index(
+    'ix_entities_name_trgm',
+    Entity.name,
+    postgresql_using='gin',
+    postgresql_ops={'name': 'gin_trgm_ops'}
+)
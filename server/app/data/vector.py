@@ -1,15 +1,131 @@
 """
 Schema for the vector database.
 
-Qdrant is used as the vector database.
+Every backend implements `VectorStore`. Qdrant is the default vector database,
+`data.local_vector.LocalVectorDB` keeps the vectors in-process. Qdrant clients are shared per connection settings,
+so every QdrantVectorDB talking to the same server reuses the same connection pool.
 """
 import os
-from typing import Dict, List, Optional, Any
+import hashlib
+import json
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Any, Literal, Set, Tuple
 from pydantic import BaseModel, Field
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 
 
+QDRANT_HOST: str = os.getenv("QDRANT_HOST", "vector-server")
+QDRANT_PORT: int = int(os.getenv("QDRANT_PORT", "6333"))
+QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+QDRANT_TIMEOUT: int = int(os.getenv("QDRANT_TIMEOUT", "10"))
+
+# Collection layout, see CollectionConfig
+QDRANT_HNSW_M: int = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_HNSW_EF: int = int(os.getenv("QDRANT_HNSW_EF", "128"))
+QDRANT_QUANTIZATION: str = os.getenv("QDRANT_QUANTIZATION", "none")
+QDRANT_QUANTIZATION_RESCORE: bool = os.getenv("QDRANT_QUANTIZATION_RESCORE", "true").lower() in ("1", "true", "yes")
+QDRANT_QUANTIZATION_OVERSAMPLING: float = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
+QDRANT_ON_DISK_VECTORS: bool = os.getenv("QDRANT_ON_DISK_VECTORS", "false").lower() in ("1", "true", "yes")
+QDRANT_ON_DISK_PAYLOAD: bool = os.getenv("QDRANT_ON_DISK_PAYLOAD", "false").lower() in ("1", "true", "yes")
+
+_clients: Dict[Tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_qdrant_client(
+    host: str = QDRANT_HOST,
+    port: int = QDRANT_PORT,
+    grpc_port: int = QDRANT_GRPC_PORT,
+    prefer_grpc: bool = QDRANT_PREFER_GRPC,
+    timeout: int = QDRANT_TIMEOUT,
+    asynchronous: bool = False
+):
+    """
+    Return the shared Qdrant client for the given connection settings, creating it on first use.
+
+    Args:
+        host: Qdrant server host
+        port: Qdrant REST port
+        grpc_port: Qdrant gRPC port
+        prefer_grpc: Use gRPC instead of REST for the calls that support it
+        timeout: Request timeout in seconds
+        asynchronous: Return an AsyncQdrantClient instead of a QdrantClient
+
+    Returns:
+        QdrantClient or AsyncQdrantClient
+    """
+    key = (host, port, grpc_port, prefer_grpc, timeout, asynchronous)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client_class = AsyncQdrantClient if asynchronous else QdrantClient
+                client = client_class(host=host, port=port, grpc_port=grpc_port, prefer_grpc=prefer_grpc, timeout=timeout)
+                _clients[key] = client
+    return client
+
+
+async def close_qdrant_clients() -> None:
+    """Close every shared client, e.g. on application shutdown."""
+    with _clients_lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for (*_, asynchronous), client in clients:
+        if asynchronous:
+            await client.close()
+        else:
+            client.close()
+
+
+# Namespace of the deterministic point IDs, changing it re-keys every stored chunk
+CHUNK_ID_NAMESPACE = uuid.UUID("3f6c1a52-52a4-4c1e-9d2b-6a1f0e8b7c11")
+
+
+def chunk_point_id(source_name: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Deterministic point ID of a chunk, derived from its source, content and metadata.
+
+    Re-ingesting an unchanged chunk yields the same ID, so it can be skipped, while
+    changed metadata yields a new point replacing the old one.
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = f"{source_name}\x00{content_hash}"
+    if metadata:
+        # Chunks without metadata keep the IDs they were stored with before metadata counted
+        canonical = json.dumps(metadata, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        key += "\x00" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, key))
+
+
+# Payload stored with every chunk, in the order search results list it
+PAYLOAD_FIELDS = ["text", "source_name", "chunk_id", "token_count", "named_entities", "metadata"]
+
+
+# Payload fields with a keyword index, used by filtered and entity-aware searches
+PAYLOAD_INDEXES = {
+    "named_entities": models.PayloadSchemaType.KEYWORD,
+    "source_name": models.PayloadSchemaType.KEYWORD,
+}
+
+
+def entity_filter(entities: List[str]) -> models.Filter:
+    """Filter matching chunks that mention any of the entities."""
+    return models.Filter(
+        must=[models.FieldCondition(key="named_entities", match=models.MatchAny(any=list(entities)))]
+    )
+
+
+def _payload_default(field: str) -> Any:
+    """Value reported for a payload field missing from a point."""
+    return {"text": "", "source_name": "", "named_entities": [], "metadata": {}}.get(field)
+
+
 class DocumentChunk(BaseModel):
     """A chunk of a document with its embedding."""
     text: str
@@ -32,15 +148,127 @@ class DocumentChunk(BaseModel):
         return self.source_name
 
 
-class QdrantVectorDB:
+class VectorStore(ABC):
+    """Interface of the stores holding the document chunks and their embeddings."""
+
+    @abstractmethod
+    def add_documents(self, documents: List[DocumentChunk]) -> List[str]:
+        """Upsert document chunks, which must have an embedding, and return their IDs."""
+
+    def add_document_chunk(self, chunk: DocumentChunk) -> str:
+        """Upsert a single document chunk and return its ID."""
+        return self.add_documents([chunk])[0]
+
+    @abstractmethod
+    def get_point_ids(self, source_name: str) -> Set[str]:
+        """Return the IDs of all chunks stored for a source."""
+
+    @abstractmethod
+    def delete_points(self, ids: List[str]) -> None:
+        """Delete chunks by ID."""
+
+    @abstractmethod
+    def set_payloads(self, payloads: Dict[str, Dict[str, Any]]) -> None:
+        """Overwrite payload fields of stored chunks, given per chunk ID, leaving the other fields as they are."""
+
+    @abstractmethod
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Return the chunks most similar to the query, best first, with their score."""
+
+    @abstractmethod
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """Run search for every query, in query order."""
+
+    async def asearch(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Async search, runs the sync one in place unless the backend does I/O."""
+        return self.search(query_embedding, limit, filter_condition, payload_fields, with_vectors)
+
+    async def asearch_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """Async batch search, runs the sync one in place unless the backend does I/O."""
+        return self.search_batch(query_embeddings, limit, filter_condition, payload_fields, with_vectors)
+
+
+class CollectionConfig(BaseModel):
+    """
+    Index, quantization and storage settings of the collection.
+
+    The defaults keep vectors and payloads in RAM without quantization. Collections
+    outgrowing the memory can opt in to on-disk storage, keeping only int8-quantized
+    vectors in RAM and rescoring the best candidates with the full vectors.
+    """
+    hnsw_m: int = QDRANT_HNSW_M
+    hnsw_ef_construct: int = QDRANT_HNSW_EF_CONSTRUCT
+    hnsw_ef: int = QDRANT_HNSW_EF
+    quantization: Literal["none", "scalar", "binary"] = QDRANT_QUANTIZATION
+    quantization_rescore: bool = QDRANT_QUANTIZATION_RESCORE
+    quantization_oversampling: float = QDRANT_QUANTIZATION_OVERSAMPLING
+    on_disk_vectors: bool = QDRANT_ON_DISK_VECTORS
+    on_disk_payload: bool = QDRANT_ON_DISK_PAYLOAD
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self):
+        """Quantization of the collection, None when disabled."""
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self) -> models.SearchParams:
+        quantization = None
+        if self.quantization != "none":
+            quantization = models.QuantizationSearchParams(
+                rescore=self.quantization_rescore,
+                oversampling=self.quantization_oversampling
+            )
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+
+class QdrantVectorDB(VectorStore):
     """Vector database for storing document embeddings using Qdrant."""
     
     def __init__(
         self, 
         collection_name: str = "documents",
-        host: str = "localhost",
-        port: int = 6333,
-        embedding_dim: int = int(os.getenv("EMBEDDING_DIMENSION"))
+        host: str = QDRANT_HOST,
+        port: int = QDRANT_PORT,
+        embedding_dim: int = int(os.getenv("EMBEDDING_DIMENSION")),
+        grpc_port: int = QDRANT_GRPC_PORT,
+        prefer_grpc: bool = QDRANT_PREFER_GRPC,
+        timeout: int = QDRANT_TIMEOUT,
+        config: Optional[CollectionConfig] = None
     ):
         """
         Initialize the Qdrant vector database.
@@ -48,29 +276,70 @@ class QdrantVectorDB:
         Args:
             collection_name: Name of the collection in Qdrant
             host: Qdrant server host
-            port: Qdrant server port
+            port: Qdrant server REST port
             embedding_dim: Dimension of the embedding vectors
+            grpc_port: Qdrant server gRPC port
+            prefer_grpc: Talk to Qdrant over gRPC instead of REST
+            timeout: Request timeout in seconds
+            config: Index, quantization and storage settings, from the environment by default
         """
         self.collection_name = collection_name
-        self.client = QdrantClient(host=host, port=port)
+        self.config = config or CollectionConfig()
+        self.search_params = self.config.search_params()
+        self._connection = dict(host=host, port=port, grpc_port=grpc_port, prefer_grpc=prefer_grpc, timeout=timeout)
+        self.client = get_qdrant_client(**self._connection)
         self.embedding_dim = embedding_dim
         
         # Create collection if it doesn't exist
         self._initialize_collection()
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        """Shared async client, created on first use so a gRPC channel binds to the running event loop."""
+        return get_qdrant_client(**self._connection, asynchronous=True)
     
     def _initialize_collection(self) -> None:
         """Create the collection if it doesn't exist."""
-        collections = self.client.get_collections().collections
-        collection_names = [collection.name for collection in collections]
-        
-        if self.collection_name not in collection_names:
+        # A single lookup instead of listing every collection
+        if not self.client.collection_exists(self.collection_name):
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=models.VectorParams(
                     size=self.embedding_dim,
-                    distance=models.Distance.COSINE
-                )
+                    distance=models.Distance.COSINE,
+                    on_disk=self.config.on_disk_vectors
+                ),
+                hnsw_config=self.config.hnsw_config(),
+                quantization_config=self.config.quantization_config(),
+                on_disk_payload=self.config.on_disk_payload
             )
+        self._create_payload_indexes()
+
+    def _create_payload_indexes(self) -> None:
+        """Index the payload fields searches filter on, existing indexes are left as they are."""
+        indexed = self.client.get_collection(self.collection_name).payload_schema or {}
+        for field, schema in PAYLOAD_INDEXES.items():
+            if field not in indexed:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=schema
+                )
+
+    def apply_collection_config(self) -> None:
+        """
+        Apply the current settings to an existing collection.
+        
+        Qdrant rebuilds the index and quantized vectors in the background,
+        the collection stays searchable meanwhile.
+        """
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            vectors_config={"": models.VectorParamsDiff(on_disk=self.config.on_disk_vectors)},
+            hnsw_config=self.config.hnsw_config(),
+            quantization_config=self.config.quantization_config() or models.Disabled.DISABLED,
+            collection_params=models.CollectionParamsDiff(on_disk_payload=self.config.on_disk_payload)
+        )
     
     def add_document_chunk(self, chunk: DocumentChunk) -> str:
         """
@@ -86,12 +355,12 @@ class QdrantVectorDB:
             raise ValueError("Document chunk must have an embedding")
         
         # Use document ID if provided, otherwise generate one
-        doc_id = chunk.id if chunk.id is not None else f"{chunk.source_name}_{chunk.chunk_id}"
+        doc_id = chunk.id if chunk.id is not None else chunk_point_id(chunk.source_name, chunk.text, chunk.metadata)
         
         
         point = models.PointStruct(
             vector=chunk.embedding,
-            id=chunk.id,
+            id=doc_id,
             payload={
                 "text": chunk.text,
                 "source_name": chunk.source_name,
@@ -126,7 +395,7 @@ class QdrantVectorDB:
                 raise ValueError(f"Document {i} has no embedding")
             
             # Use document ID if provided, otherwise generate one
-            doc_id = doc.id if doc.id else f"{doc.source_name}_{doc.chunk_id}"
+            doc_id = doc.id if doc.id else chunk_point_id(doc.source_name, doc.text, doc.metadata)
             
             points.append(
                 models.PointStruct(
@@ -150,11 +419,72 @@ class QdrantVectorDB:
         
         return [point.id for point in points]
     
+    def get_point_ids(self, source_name: str, page_size: int = 1000) -> Set[str]:
+        """
+        Collect the IDs of all points stored for a source.
+        
+        Args:
+            source_name: Source whose points to list
+            page_size: Number of points fetched per request
+            
+        Returns:
+            Set of point IDs
+        """
+        ids: Set[str] = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=models.Filter(
+                    must=[models.FieldCondition(key="source_name", match=models.MatchValue(value=source_name))]
+                ),
+                limit=page_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            ids.update(str(point.id) for point in points)
+            if offset is None:
+                return ids
+
+    def delete_points(self, ids: List[str]) -> None:
+        """
+        Delete points by ID.
+        
+        Args:
+            ids: IDs of the points to delete
+        """
+        if not ids:
+            return
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=ids)
+        )
+
+    def set_payloads(self, payloads: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Overwrite payload fields of stored points, all in one request.
+        
+        Args:
+            payloads: Payload fields to set, per point ID
+        """
+        if not payloads:
+            return
+        self.client.batch_update_points(
+            collection_name=self.collection_name,
+            update_operations=[
+                models.SetPayloadOperation(set_payload=models.SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in payloads.items()
+            ]
+        )
+    
     def search(
         self, 
         query_embedding: List[float], 
         limit: int = 5,
-        filter_condition: Optional[models.Filter] = None
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Search the vector database for similar documents.
@@ -163,28 +493,163 @@ class QdrantVectorDB:
             query_embedding: Embedding of the query
             limit: Maximum number of results to return
             filter_condition: Filter to apply to the search
+            payload_fields: Payload fields to return, all of them when None
+            with_vectors: Also return the stored embeddings
+            
+        Returns:
+            List of similar documents with their similarity scores
+        """
+        results = self.client.query_points(
+            collection_name=self.collection_name,
+            query=query_embedding,
+            limit=limit,
+            query_filter=filter_condition,
+            with_payload=self._payload_selector(payload_fields),
+            with_vectors=with_vectors,
+            search_params=self.search_params
+        )
+        
+        return self._format_results(results.points, payload_fields)
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many query embeddings in a single request.
+        
+        Args:
+            query_embeddings: Embeddings of the queries
+            limit: Maximum number of results to return per query
+            filter_condition: Filter to apply to every query
+            payload_fields: Payload fields to return, all of them when None
+            with_vectors: Also return the stored embeddings
+            
+        Returns:
+            List of similar documents for each query, in query order
+        """
+        if not query_embeddings:
+            return []
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._batch_requests(query_embeddings, limit, filter_condition, payload_fields, with_vectors, self.search_params)
+        )
+        return [self._format_results(response.points, payload_fields) for response in responses]
+
+    async def asearch(
+        self, 
+        query_embedding: List[float], 
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Search the vector database for similar documents using the async client.
+        
+        Args:
+            query_embedding: Embedding of the query
+            limit: Maximum number of results to return
+            filter_condition: Filter to apply to the search
+            payload_fields: Payload fields to return, all of them when None
+            with_vectors: Also return the stored embeddings
             
         Returns:
             List of similar documents with their similarity scores
         """
-        # Use the standard search method from Qdrant as shown in documentation
-        results = self.client.search(
+        results = await self.async_client.query_points(
             collection_name=self.collection_name,
-            query_vector=query_embedding,
+            query=query_embedding,
             limit=limit,
-            query_filter=filter_condition
+            query_filter=filter_condition,
+            with_payload=self._payload_selector(payload_fields),
+            with_vectors=with_vectors,
+            search_params=self.search_params
         )
         
+        return self._format_results(results.points, payload_fields)
+
+    async def asearch_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        filter_condition: Optional[models.Filter] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many query embeddings in a single request using the async client.
+        
+        Args:
+            query_embeddings: Embeddings of the queries
+            limit: Maximum number of results to return per query
+            filter_condition: Filter to apply to every query
+            payload_fields: Payload fields to return, all of them when None
+            with_vectors: Also return the stored embeddings
+            
+        Returns:
+            List of similar documents for each query, in query order
+        """
+        if not query_embeddings:
+            return []
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._batch_requests(query_embeddings, limit, filter_condition, payload_fields, with_vectors, self.search_params)
+        )
+        return [self._format_results(response.points, payload_fields) for response in responses]
+
+    @staticmethod
+    def _payload_selector(payload_fields: Optional[List[str]]):
+        """Translate a field selection into Qdrant's with_payload argument."""
+        if payload_fields is None:
+            return True
+        return list(payload_fields) if payload_fields else False
+
+    @classmethod
+    def _batch_requests(
+        cls,
+        query_embeddings: List[List[float]],
+        limit: int,
+        filter_condition: Optional[models.Filter],
+        payload_fields: Optional[List[str]],
+        with_vectors: bool,
+        search_params: Optional[models.SearchParams] = None
+    ) -> List[models.QueryRequest]:
         return [
-            {
-                "id": str(result.id),
-                "text": result.payload.get("text", ""),
-                "source_name": result.payload.get("source_name", ""),
-                "chunk_id": result.payload.get("chunk_id"),
-                "token_count": result.payload.get("token_count"),
-                "named_entities": result.payload.get("named_entities", []),
-                "metadata": result.payload.get("metadata", {}),
-                "score": result.score
-            }
-            for result in results
+            models.QueryRequest(
+                query=embedding,
+                limit=limit,
+                filter=filter_condition,
+                with_payload=cls._payload_selector(payload_fields),
+                with_vector=with_vectors,
+                params=search_params
+            )
+            for embedding in query_embeddings
         ]
+
+    @staticmethod
+    def _format_results(results: List[models.ScoredPoint], payload_fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Convert Qdrant scored points into plain dictionaries holding the selected payload fields."""
+        fields = PAYLOAD_FIELDS if payload_fields is None else payload_fields
+        formatted = []
+        for result in results:
+            payload = result.payload or {}
+            record = {"id": str(result.id)}
+            for field in fields:
+                record[field] = payload[field] if field in payload else _payload_default(field)
+            record["score"] = result.score
+            if result.vector is not None:
+                record["embedding"] = result.vector
+            formatted.append(record)
+        return formatted
+
+
+if __name__ == "__main__":
+    # Apply the collection settings from the environment to an existing collection
+    vector_db = QdrantVectorDB(collection_name=os.getenv("QDRANT_COLLECTION_NAME", "documents"))
+    vector_db.apply_collection_config()
+    print(f"Updated {vector_db.collection_name}: {vector_db.config.model_dump()}")
@@ -0,0 +1,159 @@
+"""
+Token-aware chunking of documents.
+
+Text is segmented into sentences and paragraphs and packed into chunks that never
+exceed a token budget measured with the embedding model's tokenizer. Consecutive
+chunks overlap by whole sentences. Input can arrive in pieces and chunks are produced
+lazily, so documents never have to be fully held in memory.
+
+Chunks end at content-defined boundaries: whether a sentence closes a chunk only
+depends on its own text, as long as the chunk has reached a minimum size. Chunk
+boundaries therefore don't move when text before them is edited, and re-ingesting
+an edited document only changes the chunks around the edit instead of every chunk
+after it.
+"""
+import re
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+from pydantic import BaseModel
+from rag.tokens import get_encoding
+
+# A sentence ends with terminal punctuation followed by whitespace, a paragraph with a blank line.
+BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n\s*')
+
+
+class TextChunk(BaseModel):
+    """A chunk of text with its position in the document and its size in tokens."""
+    chunk_id: int
+    text: str
+    token_count: int
+
+
+class TokenChunker:
+    """Packs sentences and paragraphs into overlapping chunks bounded in tokens."""
+
+    def __init__(
+        self,
+        max_tokens: int,
+        overlap_tokens: int,
+        model: str = "text-embedding-3-small",
+        encoding=None,
+        average_tokens: Optional[int] = None
+    ):
+        """
+        Initialize the chunker.
+
+        Args:
+            max_tokens: Maximum number of tokens in a chunk
+            overlap_tokens: Maximum number of tokens repeated from the end of the previous chunk
+            model: Model whose tokenizer measures the chunks
+            encoding: Tokenizer to use instead of the model's one
+            average_tokens: Average number of new tokens between two content-defined boundaries,
+                a third of the chunk size by default
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.average_tokens = average_tokens or max(max_tokens // 3, 1)
+        # Chunks hold at least this many new tokens before a boundary closes them
+        self.min_tokens = max_tokens // 4
+        self.encoding = encoding or get_encoding(model)
+        # Text without any boundary is cut once it is this long, so memory stays bounded
+        self.max_pending_chars = max_tokens * 16
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+    def chunks(self, pieces: Iterable[str]) -> Iterator[TextChunk]:
+        """
+        Chunk text arriving in pieces.
+
+        Args:
+            pieces: Consecutive pieces of the document, e.g. a whole string in a list or lines of a file
+
+        Yields:
+            Chunks in document order
+        """
+        chunk_id = 0
+        window: List[Tuple[str, int]] = []
+        window_tokens = 0
+        # Tokens of the window not repeated from the previous chunk
+        fresh_tokens = 0
+        for unit in self._units(pieces):
+            for text, tokens in self._fit(unit):
+                if fresh_tokens and window_tokens + tokens > self.max_tokens:
+                    chunk = self._make_chunk(chunk_id, window)
+                    if chunk is not None:
+                        yield chunk
+                        chunk_id += 1
+                    window = self._overlap(window)
+                    window_tokens = sum(count for _, count in window)
+                    fresh_tokens = 0
+                while window and window_tokens + tokens > self.max_tokens:
+                    window_tokens -= window.pop(0)[1]
+                window.append((text, tokens))
+                window_tokens += tokens
+                fresh_tokens += tokens
+                if fresh_tokens >= self.min_tokens and self._is_boundary(text, tokens):
+                    chunk = self._make_chunk(chunk_id, window)
+                    if chunk is not None:
+                        yield chunk
+                        chunk_id += 1
+                    window = self._overlap(window)
+                    window_tokens = sum(count for _, count in window)
+                    fresh_tokens = 0
+        if fresh_tokens:
+            chunk = self._make_chunk(chunk_id, window)
+            if chunk is not None:
+                yield chunk
+
+    def _units(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Split incoming text into sentences and paragraphs, keeping the trailing whitespace of each."""
+        pending = ""
+        for piece in pieces:
+            pending += piece
+            start = 0
+            for match in BOUNDARY.finditer(pending):
+                # A boundary at the very end may continue in the next piece
+                if match.end() == len(pending):
+                    break
+                yield pending[start:match.end()]
+                start = match.end()
+            pending = pending[start:]
+            if len(pending) > self.max_pending_chars:
+                yield pending
+                pending = ""
+        if pending:
+            yield pending
+
+    def _fit(self, unit: str) -> Iterator[Tuple[str, int]]:
+        """Yield the unit with its token count, cut at token boundaries if it alone exceeds the budget."""
+        tokens = self.encoding.encode_ordinary(unit)
+        if len(tokens) <= self.max_tokens:
+            yield unit, len(tokens)
+            return
+        for start in range(0, len(tokens), self.max_tokens):
+            part = tokens[start:start + self.max_tokens]
+            yield self.encoding.decode(part), len(part)
+
+    def _is_boundary(self, text: str, tokens: int) -> bool:
+        """Whether a unit ends a chunk, decided by its content alone with a probability proportional to its size."""
+        return zlib.crc32(text.strip().encode()) % self.average_tokens < tokens
+
+    def _overlap(self, window: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        """Trailing units of a finished chunk that fit into the overlap budget."""
+        overlap: List[Tuple[str, int]] = []
+        tokens = 0
+        for text, count in reversed(window):
+            if tokens + count > self.overlap_tokens:
+                break
+            overlap.insert(0, (text, count))
+            tokens += count
+        return overlap
+
+    def _make_chunk(self, chunk_id: int, window: List[Tuple[str, int]]) -> Optional[TextChunk]:
+        text = "".join(unit for unit, _ in window).strip()
+        if not text:
+            return None
+        return TextChunk(chunk_id=chunk_id, text=text, token_count=self.count_tokens(text))
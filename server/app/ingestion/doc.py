@@ -1,44 +1,67 @@
-from typing import List
+from typing import Iterator, List, Optional
 from data.vector import DocumentChunk
+from ingestion.chunker import TextChunk, TokenChunker
 from ner.NamedEntityExtraction import EntityRecognition
+from ner.registry import get_entity_recognition
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-DOC_MAX_CHUNK_SIZE: int = int(os.getenv("DOC_MAX_CHUNK_SIZE"))  # e.g. 8000
-DOC_CHUNK_OVERLAP: int = int(os.getenv("DOC_CHUNK_OVERLAP"))  # e.g. 100
+# In tokens of the embedding model, not characters, so several chunks fit the prompt budget
+DOC_MAX_CHUNK_SIZE: int = int(os.getenv("DOC_MAX_CHUNK_SIZE", "512"))
+DOC_CHUNK_OVERLAP: int = int(os.getenv("DOC_CHUNK_OVERLAP", "64"))
+EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
 
 class Document:
     """A document with its content."""
 
-    def __init__(self, content: str, source_name: str):
+    def __init__(self, content: str, source_name: str, ner: Optional[EntityRecognition] = None):
         self.content = content
         self.source_name = source_name
+        self.ner = ner
+
+    def iter_chunks(self) -> Iterator[TextChunk]:
+        """
+        Lazily split the content into overlapping chunks bounded in tokens.
+
+        :return: generator of TextChunk instances
+        """
+        chunker = TokenChunker(DOC_MAX_CHUNK_SIZE, DOC_CHUNK_OVERLAP, model=EMBEDDING_MODEL)
+        return chunker.chunks([self.content])
 
     def chunkize(self) -> List[DocumentChunk]:
         """
-        Chunk the document into overlapping chunks.
+        Chunk the document into overlapping, sentence-aligned chunks and tag their named entities.
 
         :return: list of DocumentChunk instances
         """
-        ner = EntityRecognition()
-        chunks: List[DocumentChunk] = []
-        start: int = 0
-        while start < len(self.content):
-            end: int = min(start + DOC_MAX_CHUNK_SIZE, len(self.content))
-            chunk_text: str = self.content[start:end]
-            named_entities: List[str] = [entity.text for entity in ner.extract_named_entities(chunk_text)]
-            chunks.append(
-                DocumentChunk(
-                    text=chunk_text,
-                    source_name=self.source_name,
-                    token_count=len(chunk_text),
-                    named_entities=named_entities,
-                    metadata={}
-                )
+        return chunkize_documents([self], ner=self.ner)
+
+
+def chunkize_documents(documents: List[Document], ner: Optional[EntityRecognition] = None) -> List[DocumentChunk]:
+    """
+    Chunk several documents, tagging the chunks of all of them in one batched NER pass.
+
+    :param documents: documents to chunk
+    :param ner: entity recognition to use, the shared one by default
+    :return: list of DocumentChunk instances in document order
+    """
+    ner = ner or get_entity_recognition()
+    pieces = [(document, chunk) for document in documents for chunk in document.iter_chunks()]
+    entities = ner.extract_named_entities_batch([chunk.text for _, chunk in pieces])
+
+    chunks: List[DocumentChunk] = []
+    for (document, chunk), chunk_entities in zip(pieces, entities):
+        chunks.append(
+            DocumentChunk(
+                text=chunk.text,
+                source_name=document.source_name,
+                chunk_id=chunk.chunk_id,
+                token_count=chunk.token_count,
+                named_entities=[entity.text for entity in chunk_entities],
+                metadata={}
             )
-            # move start forward by chunk_size - overlap
-            start += DOC_MAX_CHUNK_SIZE - DOC_CHUNK_OVERLAP
-        return chunks
+        )
+    return chunks
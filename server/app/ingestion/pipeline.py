@@ -0,0 +1,265 @@
+"""
+Streaming ingestion pipeline.
+
+chunk -> NER -> embed -> upsert, each stage running in its own thread and
+connected to the next one by a bounded queue. A slow stage makes the previous
+ones wait instead of buffering, so memory stays constant however large the
+document is, and chunks are upserted in fixed-size batches as they become ready.
+
+Point IDs are derived from the source, the chunk content and the metadata, so
+re-ingesting a document only tags, embeds and upserts the chunks that changed,
+updates the position of the others, and removes the points of chunks that no
+longer exist once the whole document went through.
+"""
+import contextvars
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from pydantic import BaseModel
+from data.vector import DocumentChunk, chunk_point_id
+from ingestion.chunker import TokenChunker
+from metrics import stage
+from ner.NamedEntityExtraction import EntityRecognition
+from ner.registry import get_entity_recognition
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_UPSERT_BATCH_SIZE: int = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "128"))
+
+_DONE = object()
+
+
+class IngestionProgress(BaseModel):
+    """Number of chunks that went through every stage so far."""
+    source_name: str
+    chunks: int = 0
+    tagged: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    done: bool = False
+
+
+class _Stopped(Exception):
+    """Raised inside a stage when another stage failed."""
+
+
+class IngestionPipeline:
+    """Runs documents through chunking, NER, embedding and upsert with bounded memory."""
+
+    def __init__(
+        self,
+        embedder,
+        vector_db,
+        chunker: TokenChunker,
+        ner: Optional[EntityRecognition] = None,
+        batch_size: int = INGEST_BATCH_SIZE,
+        upsert_batch_size: int = INGEST_UPSERT_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            embedder: Embedder used for the chunks
+            vector_db: Vector database receiving the chunks
+            chunker: Chunker splitting the incoming text
+            ner: Entity recognition to use, the shared one by default
+            batch_size: Number of chunks tagged and embedded together
+            upsert_batch_size: Number of chunks per upsert request
+            queue_size: Number of batches buffered between two stages
+        """
+        self.embedder = embedder
+        self.vector_db = vector_db
+        self.chunker = chunker
+        self.ner = ner or get_entity_recognition()
+        self.batch_size = batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.queue_size = queue_size
+
+    def run(
+        self,
+        pieces: Iterable[str],
+        source_name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        on_progress: Optional[Callable[[IngestionProgress], None]] = None
+    ) -> IngestionProgress:
+        """
+        Ingest a document arriving in pieces.
+
+        Args:
+            pieces: Consecutive pieces of the document text
+            source_name: Name of the document source
+            metadata: Metadata stored with every chunk
+            on_progress: Called with a snapshot of the progress after every upsert
+                and once more when done
+
+        Returns:
+            Final progress
+
+        Raises:
+            Exception: The first error raised by any stage
+        """
+        progress = IngestionProgress(source_name=source_name)
+        existing = self.vector_db.get_point_ids(source_name)
+        seen = set()
+        stop = threading.Event()
+        errors: List[Exception] = []
+        tag_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        embed_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        upsert_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        def report() -> None:
+            if on_progress is not None:
+                on_progress(progress.model_copy())
+
+        def tag() -> None:
+            while (batch := self._get(tag_queue, stop)) is not _DONE:
+                with stage("ingest_ner"):
+                    entities = self.ner.extract_named_entities_batch([chunk.text for _, chunk in batch])
+                tagged = [
+                    DocumentChunk(
+                        id=point_id,
+                        text=chunk.text,
+                        source_name=source_name,
+                        chunk_id=chunk.chunk_id,
+                        token_count=chunk.token_count,
+                        named_entities=[entity.text for entity in chunk_entities],
+                        metadata=metadata or {}
+                    )
+                    for (point_id, chunk), chunk_entities in zip(batch, entities)
+                ]
+                progress.tagged += len(tagged)
+                self._put(embed_queue, tagged, stop)
+
+        def embed() -> None:
+            while (batch := self._get(embed_queue, stop)) is not _DONE:
+                with stage("ingest_embedding"):
+                    embeddings = self.embedder.embed_documents([chunk.text for chunk in batch])
+                for chunk, embedding in zip(batch, embeddings):
+                    chunk.embedding = embedding
+                progress.embedded += len(batch)
+                self._put(upsert_queue, batch, stop)
+
+        def upsert() -> None:
+            pending: List[DocumentChunk] = []
+            while (batch := self._get(upsert_queue, stop)) is not _DONE:
+                pending.extend(batch)
+                while len(pending) >= self.upsert_batch_size:
+                    self._upsert(pending[:self.upsert_batch_size], progress)
+                    pending = pending[self.upsert_batch_size:]
+                    report()
+            if pending:
+                self._upsert(pending, progress)
+                report()
+
+        threads = [
+            self._start(tag, embed_queue, stop, errors),
+            self._start(embed, upsert_queue, stop, errors),
+            self._start(upsert, None, stop, errors),
+        ]
+        try:
+            batch = []
+            # Position of the chunks stored already, which moves when text before them changed
+            payloads: Dict[str, Dict[str, Any]] = {}
+            for chunk in self.chunker.chunks(pieces):
+                progress.chunks += 1
+                point_id = chunk_point_id(source_name, chunk.text, metadata)
+                if point_id in seen or point_id in existing:
+                    # Stored already, or repeated within the document
+                    if point_id not in seen:
+                        payloads[point_id] = {"chunk_id": chunk.chunk_id, "metadata": metadata or {}}
+                    seen.add(point_id)
+                    progress.skipped += 1
+                    if len(payloads) >= self.upsert_batch_size:
+                        self.vector_db.set_payloads(payloads)
+                        payloads = {}
+                    continue
+                seen.add(point_id)
+                batch.append((point_id, chunk))
+                if len(batch) >= self.batch_size:
+                    self._put(tag_queue, batch, stop)
+                    batch = []
+            if batch:
+                self._put(tag_queue, batch, stop)
+            self.vector_db.set_payloads(payloads)
+        except _Stopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            self._put_done(tag_queue, stop)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+        # Only a complete run tells which stored chunks are gone
+        stale = list(existing - seen)
+        self.vector_db.delete_points(stale)
+        progress.deleted = len(stale)
+        progress.done = True
+        report()
+        logger.info(
+            f"Ingested {source_name}: {progress.upserted} chunks upserted, "
+            f"{progress.skipped} unchanged, {progress.deleted} deleted"
+        )
+        return progress
+
+    def _upsert(self, chunks: List[DocumentChunk], progress: IngestionProgress) -> None:
+        with stage("ingest_upsert"):
+            self.vector_db.add_documents(chunks)
+        progress.upserted += len(chunks)
+        logger.info(f"Upserted {progress.upserted}/{progress.chunks} chunks of {progress.source_name}")
+
+    def _start(self, target: Callable[[], None], outbox: Optional[queue.Queue], stop: threading.Event, errors: List[Exception]) -> threading.Thread:
+        def run_stage() -> None:
+            try:
+                target()
+            except _Stopped:
+                pass
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                if outbox is not None:
+                    self._put_done(outbox, stop)
+
+        # Stage timings count towards the request that started the ingestion
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(run_stage,), daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _put(q: queue.Queue, item: Any, stop: threading.Event) -> None:
+        """Block until there is room in the queue, unless the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    @staticmethod
+    def _get(q: queue.Queue, stop: threading.Event) -> Any:
+        """Block until an item is available, unless the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise _Stopped()
+
+    @classmethod
+    def _put_done(cls, q: queue.Queue, stop: threading.Event) -> None:
+        try:
+            cls._put(q, _DONE, stop)
+        except _Stopped:
+            pass
@@ -1,15 +1,31 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional, Literal
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, Literal, Awaitable, Tuple
 from contextlib import asynccontextmanager
-from data.sql_client import SQLClient
+from data.sql_client import SQLClient, SyncResult
+from data.dictionary import read_dictionary
+from data.fuzzy import FuzzyIndex
+from data.vector import close_qdrant_clients
+from startup import Startup
 import os
+import json
+import queue
+import secrets
+import codecs
+import asyncio
+import threading
 import logging
 from traceback import print_exc
 from ner.NamedEntityExtraction import EntityRecognition
+from ner.jargon import JargonMatcher
+from ner.registry import get_entity_recognition
 
 from rag.rag import Rag
+from metrics import REGISTRY, RequestMetricsMiddleware, register_rag, stage
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,6 +47,20 @@ class ExplanationResponse(BaseModel):
     explanation: str
     definitions: List[Entity]
 
+# Largest batch accepted by /explain/batch, larger ones are rejected with 422
+EXPLAIN_BATCH_MAX_ITEMS = int(os.getenv("EXPLAIN_BATCH_MAX_ITEMS", "64"))
+
+class BatchExplanationRequest(BaseModel):
+    items: List[TextRequest] = Field(max_length=EXPLAIN_BATCH_MAX_ITEMS)
+
+class BatchExplanationItem(BaseModel):
+    explanation: Optional[str] = None
+    definitions: List[Entity] = []
+    error: Optional[str] = None
+
+class BatchExplanationResponse(BaseModel):
+    results: List[BatchExplanationItem]
+
 class DocumentChunk(BaseModel):
     content: str
     source: str
@@ -40,32 +70,88 @@ class SaveResponse(BaseModel):
     success: bool
     message: str
 
+class DictionaryEntry(BaseModel):
+    name: str
+    definition: Optional[str] = None
+
+class DictionarySyncRequest(BaseModel):
+    # The dictionary.csv shipped with the server when not given
+    entries: Optional[List[DictionaryEntry]] = None
+    prune: bool = False
+
+class StreamSaveResponse(SaveResponse):
+    chunks: int
+    upserted: int
+    skipped: int
+    deleted: int
+
 rag = {}
+SERVICES = ('sql_client', 'ner', 'jargon', 'rag')
+
+EXPLAIN_BATCH_CONCURRENCY = int(os.getenv("EXPLAIN_BATCH_CONCURRENCY", "4"))
+# Bearer token of the administrative endpoints, they are disabled when unset
+ADMIN_TOKEN: Optional[str] = os.getenv("ADMIN_TOKEN") or None
+
+
+def init_sql_client() -> SQLClient:
+    sql_client = SQLClient()
+    sql_client.init()
+    sql_client.load_jargon()
+    sql_client.listen_for_changes()
+    return sql_client
+
+def compile_jargon(index: FuzzyIndex) -> None:
+    """Compile the terms of the dictionary index into the NER."""
+    ner_recognition: EntityRecognition = rag['ner']
+    ner_recognition.use_jargon(index.names)
+
+def init_jargon() -> Optional[JargonMatcher]:
+    """Compile the dictionary terms into the NER, again whenever the dictionary changes."""
+    sql_client: SQLClient = rag['sql_client']
+    # Registered once however often the startup step is retried
+    sql_client.on_jargon_reload(compile_jargon)
+    compile_jargon(sql_client.jargon_index)
+    return rag['ner'].jargon
+
+def init_rag(api_key: str) -> Rag:
+    rag_ = Rag(api_key=api_key, context_path="app/rag/context.json")
+    rag_.warmup()
+    return rag_
 
+startup: Optional[Startup] = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     from dotenv import load_dotenv
-    global rag
-
+    global startup
     load_dotenv()
     # Get API key from environment variable
     api_key = os.getenv("OPENAI_API_KEY")
-    embedder_model = os.getenv("EMBEDDING_MODEL")
-    embedder_dimension = os.getenv("EMBEDDING_DIMENSION")
     if not api_key:
         logger.error("OPENAI_API_KEY environment variable is not set")
         raise ValueError("OPENAI_API_KEY environment variable is not set")
-    
-    # Load the ML model
-    rag['sql_client'] = SQLClient()
-    rag['sql_client'].load_jargon()
-    rag['ner'] = EntityRecognition()
-    rag['rag'] = Rag(api_key=api_key, context_path="app/rag/context.json")
-    logger.info("RAG service initialized successfully")
+
+    # Services are brought up concurrently while the server already answers the probes,
+    # see /readyz
+    register_rag(lambda: rag.get('rag'))
+    startup = Startup(
+        {
+            'sql_client': init_sql_client,
+            'ner': get_entity_recognition,
+            'jargon': init_jargon,
+            'rag': lambda: init_rag(api_key),
+        },
+        on_ready=rag.__setitem__,
+        depends_on={'jargon': ['sql_client', 'ner']}
+    )
+    startup.start()
 
     yield
     logger.info("Shutting down RAG service")
+    await startup.stop()
+    if 'sql_client' in rag:
+        await run_in_threadpool(rag['sql_client'].stop_listening)
+    await close_qdrant_clients()
 
 
 """Create and configure the FastAPI application."""
@@ -80,42 +166,100 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(RequestMetricsMiddleware, skip_paths=("/metrics", "/healthz", "/readyz"))
+
 @app.get('/')
 def main():
     return "Hello world"
 
-@app.post("/explain", response_model=ExplanationResponse)
-async def explain_text(request: TextRequest):
-    entities: SQLClient = rag['sql_client']
+@app.get('/healthz')
+def healthz():
+    """Liveness: the process serves requests and startup has not given up."""
+    if startup is not None and startup.failed:
+        return JSONResponse({"status": "failed", "steps": startup.state}, status_code=503)
+    return {"status": "ok"}
+
+@app.get('/readyz')
+def readyz():
+    """Readiness: every service the endpoints need is up."""
+    ready = all(name in rag for name in SERVICES)
+    body = {"status": "ready" if ready else "starting", "steps": startup.state if startup is not None else {}}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+def require_ready() -> None:
+    """Reject requests arriving before startup is done instead of failing halfway through."""
+    if not all(name in rag for name in SERVICES):
+        raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "1"})
+
+def require_admin(authorization: Optional[str] = Header(default=None)) -> None:
+    """Only let requests carrying the ADMIN_TOKEN bearer token through."""
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="Administrative endpoints are disabled, set ADMIN_TOKEN to enable them")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get('/metrics')
+def metrics():
+    """Prometheus metrics: request and stage latencies, token counts, cache hits and in-flight requests."""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+async def extract_entities(text: str) -> list:
+    """Run NER off the event loop."""
     ner_recognition: EntityRecognition = rag['ner']
-    rag_: Rag = rag['rag']
-    
-    try: 
-        ents = ner_recognition.extract_named_entities(request.text)
-        ents_: List[Entity] = []
-        for ent in ents:
-            found_entity = entities.search_word(ent.text)
-            if found_entity is not None:
-                ents_.append(
-                    Entity(
-                        entity=found_entity[0],
-                        definition=found_entity[1],
-                        start=ent.start,
-                        stop=ent.stop
-                    )
-                )
-    except Exception as e:
-        logger.error(f"Error explaining text: {e}")
-        print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    with stage("ner"):
+        return await run_in_threadpool(ner_recognition.extract_named_entities, text)
+
+def names_of(ents: list) -> List[str]:
+    """Distinct entity texts, in order of appearance."""
+    return list(dict.fromkeys(ent.text for ent in ents))
+
+async def entity_names(ner_task: Awaitable[list]) -> List[str]:
+    return names_of(await ner_task)
+
+def start_retrieval(rag_: Rag, text: str) -> Tuple[asyncio.Task, asyncio.Task]:
+    """Start NER and the retrieval that embeds the text meanwhile and then ranks chunks naming its entities higher."""
+    ner_task = asyncio.create_task(extract_entities(text))
+    search_task = asyncio.create_task(rag_.asearch_context(text, entities=asyncio.create_task(entity_names(ner_task))))
+    return ner_task, search_task
+
+async def resolve_entities(text: str, ents: Optional[list] = None) -> List[Entity]:
+    """Run NER, unless already done, and dictionary lookup off the event loop."""
+    entities: SQLClient = rag['sql_client']
+
+    if ents is None:
+        ents = await extract_entities(text)
+    with stage("dictionary"):
+        found_entities = await run_in_threadpool(entities.search_words, [ent.text for ent in ents])
     logging.info(ents)
+    return [
+        Entity(
+            entity=found_entity[0],
+            definition=found_entity[1],
+            start=ent.start,
+            stop=ent.stop
+        )
+        for ent, found_entity in zip(ents, found_entities)
+        if found_entity is not None
+    ]
+
+@app.post("/explain", response_model=ExplanationResponse, dependencies=[Depends(require_ready)])
+async def explain_text(request: TextRequest):
+    rag_: Rag = rag['rag']
     
+    # The request is embedded during NER, NER feeds both the dictionary lookup and the retrieval,
+    # which is cancelled if the explanation turns out to be cached
+    # and when the client goes away or the request fails
+    ner_task, search_task = start_retrieval(rag_, request.text)
     try:
-        rag_results = rag_.process_request(request.text, request.explanationLevel, request.userRole, request.additionalContext, [(ent.entity,ent.definition) for ent in ents_])
+        ents_ = await resolve_entities(request.text, await ner_task)
+        rag_results = await rag_.aprocess_request(request.text, request.explanationLevel, request.userRole, request.additionalContext, [(ent.entity,ent.definition) for ent in ents_], contexts=search_task)
     except Exception as e:
         logger.error(f"Error explaining text: {e}")
         print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        search_task.cancel()
 
         
     return ExplanationResponse(
@@ -123,7 +267,174 @@ async def explain_text(request: TextRequest):
             definitions=ents_
         )
 
-@app.post("/save-document", response_model=SaveResponse)
+async def extract_entities_batch(texts: List[str]) -> List[list]:
+    """Run batched NER off the event loop."""
+    ner_recognition: EntityRecognition = rag['ner']
+    with stage("ner"):
+        return await run_in_threadpool(ner_recognition.extract_named_entities_batch, texts)
+
+async def resolve_entities_batch(texts: List[str], ents_per_text: Optional[List[list]] = None) -> List[List[Entity]]:
+    """Run batched NER, unless already done, and one dictionary lookup for all distinct entities off the event loop."""
+    entities: SQLClient = rag['sql_client']
+
+    if ents_per_text is None:
+        ents_per_text = await extract_entities_batch(texts)
+    words = list(dict.fromkeys(ent.text for ents in ents_per_text for ent in ents))
+    with stage("dictionary"):
+        found = dict(zip(words, await run_in_threadpool(entities.search_words, words)))
+    return [
+        [
+            Entity(
+                entity=found[ent.text][0],
+                definition=found[ent.text][1],
+                start=ent.start,
+                stop=ent.stop
+            )
+            for ent in ents
+            if found[ent.text] is not None
+        ]
+        for ents in ents_per_text
+    ]
+
+@app.post("/explain/batch", response_model=BatchExplanationResponse, dependencies=[Depends(require_ready)])
+async def explain_text_batch(request: BatchExplanationRequest):
+    """Explain many sentences at once.
+
+    NER, embedding and vector search run once for the whole batch, completions run
+    with bounded concurrency and each item reports its own result or error. When NER,
+    dictionary lookup, embedding or search fail, they fail for the whole batch and every
+    item reports that error. At most EXPLAIN_BATCH_MAX_ITEMS items are accepted.
+    """
+    rag_: Rag = rag['rag']
+    texts = [item.text for item in request.items]
+
+    async def names_per_text() -> List[List[str]]:
+        return [names_of(ents) for ents in await ner_task]
+
+    async def lookup() -> List[List[Entity]]:
+        return await resolve_entities_batch(texts, await ner_task)
+
+    ner_task = asyncio.create_task(extract_entities_batch(texts))
+    ents_per_text, contexts_per_text = await asyncio.gather(
+        lookup(),
+        rag_.asearch_context_batch(texts, entities=asyncio.create_task(names_per_text())),
+        return_exceptions=True
+    )
+    for result in (ents_per_text, contexts_per_text):
+        if isinstance(result, Exception):
+            logger.error(f"Error explaining batch: {result}")
+            return BatchExplanationResponse(results=[BatchExplanationItem(error=str(result)) for _ in texts])
+        if isinstance(result, BaseException):
+            raise result
+
+    semaphore = asyncio.Semaphore(EXPLAIN_BATCH_CONCURRENCY)
+
+    async def explain_item(item: TextRequest, ents_: List[Entity], contexts: List[str]) -> BatchExplanationItem:
+        async with semaphore:
+            try:
+                explanation = await rag_.aprocess_request(item.text, item.explanationLevel, item.userRole, item.additionalContext, [(ent.entity,ent.definition) for ent in ents_], contexts=contexts)
+            except Exception as e:
+                logger.error(f"Error explaining batch item: {e}")
+                return BatchExplanationItem(definitions=ents_, error=str(e))
+        return BatchExplanationItem(explanation=explanation, definitions=ents_)
+
+    results = await asyncio.gather(*[
+        explain_item(item, ents_, contexts)
+        for item, ents_, contexts in zip(request.items, ents_per_text, contexts_per_text)
+    ])
+    return BatchExplanationResponse(results=results)
+
+class TaskStreamingResponse(StreamingResponse):
+    """Streaming response that cancels the task feeding it once the response ends, also when the client
+    goes away or the response is dropped before streaming starts."""
+
+    def __init__(self, content, task: asyncio.Task, **kwargs):
+        super().__init__(content, **kwargs)
+        self.task = task
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.task.cancel()
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/explain/stream", dependencies=[Depends(require_ready)])
+async def explain_text_stream(request: TextRequest):
+    """Explain text as a stream of server-sent events.
+
+    Events:
+        definitions: {"definitions": [Entity]}, sent as soon as the dictionary lookup is done
+        token: {"text": str}, pieces of the explanation as the model produces them
+        done: {"explanation": str}, the final explanation
+        error: {"detail": str}, the stream ends after it
+    """
+    rag_: Rag = rag['rag']
+
+    ner_task, search_task = start_retrieval(rag_, request.text)
+    try:
+        ents_ = await resolve_entities(request.text, await ner_task)
+    except asyncio.CancelledError:
+        search_task.cancel()
+        raise
+    except Exception as e:
+        search_task.cancel()
+        logger.error(f"Error explaining text: {e}")
+        print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        yield sse_event("definitions", {"definitions": [ent.model_dump() for ent in ents_]})
+        try:
+            async for kind, text in rag_.astream_request(request.text, request.explanationLevel, request.userRole, request.additionalContext, [(ent.entity,ent.definition) for ent in ents_], contexts=search_task):
+                if kind == "token":
+                    yield sse_event("token", {"text": text})
+                else:
+                    yield sse_event("done", {"explanation": text})
+        except Exception as e:
+            logger.error(f"Error explaining text: {e}")
+            print_exc()
+            yield sse_event("error", {"detail": str(e)})
+
+    return TaskStreamingResponse(
+        events(),
+        search_task,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/dictionary/sync", response_model=SyncResult, dependencies=[Depends(require_admin), Depends(require_ready)])
+async def sync_dictionary(request: DictionarySyncRequest):
+    """Write the dictionary terms that are new or changed, the lookup index of every server is rebuilt.
+
+    Requires the ADMIN_TOKEN bearer token. Servers rebuild their index when notified
+    of the change, or at their next check when change notifications are unavailable.
+
+    Args:
+        request: Terms to sync, dictionary.csv by default, and whether to delete the others
+
+    Returns:
+        SyncResult with the number of terms written
+    """
+    sql_client: SQLClient = rag['sql_client']
+    if request.prune and request.entries is not None and not request.entries:
+        raise HTTPException(status_code=400, detail="Refusing to prune the whole dictionary with an empty list of terms")
+
+    def sync() -> SyncResult:
+        entries = read_dictionary() if request.entries is None else [(entry.name.strip(), entry.definition) for entry in request.entries]
+        return sql_client.sync_jargon(entries, prune=request.prune)
+
+    try:
+        return await run_in_threadpool(sync)
+    except Exception as e:
+        logger.error(f"Error syncing dictionary: {e}")
+        print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/save-document", response_model=SaveResponse, dependencies=[Depends(require_ready)])
 async def save_document(document: DocumentChunk):
     """Save a document chunk to the Qdrant database.
     
@@ -140,7 +451,8 @@ async def save_document(document: DocumentChunk):
     
     try:
         # Use the RAG instance to save the document chunk
-        success = rag_.save_document_chunk(
+        success = await run_in_threadpool(
+            rag_.save_document_chunk,
             content=document.content,
             source=document.source,
             metadata=document.metadata,
@@ -177,5 +489,82 @@ async def save_document(document: DocumentChunk):
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/save-document/stream", response_model=StreamSaveResponse, dependencies=[Depends(require_ready)])
+async def save_document_stream(request: Request, source: str, metadata: Optional[str] = None):
+    """Save a document sent as a raw (optionally chunked) UTF-8 request body.
+
+    The body is consumed as it arrives and fed through the ingestion pipeline,
+    so memory use does not depend on the document size.
+    
+    Args:
+        request: Request whose body is the document text
+        source: Name of the document source
+        metadata: Optional JSON object stored with every chunk
+        
+    Returns:
+        StreamSaveResponse with the number of chunks saved
+    """
+    rag_: Rag = rag['rag']
+    try:
+        metadata_ = json.loads(metadata) if metadata else None
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metadata: {str(e)}")
+
+    pieces: queue.Queue = queue.Queue(maxsize=4)
+    aborted = threading.Event()
+    # Ends the pieces without completing the document, see read_pieces
+    incomplete = object()
 
-    
\ No newline at end of file
+    def read_pieces():
+        while (piece := pieces.get()) is not None:
+            if piece is incomplete:
+                # Fails the ingestion, so chunks missing from a truncated upload are not deleted
+                raise ConnectionError(f"Upload of {source} ended before the document was complete")
+            yield piece
+
+    def put_piece(piece: Any) -> None:
+        # Waits for the pipeline to catch up, gives up once it has stopped
+        while not aborted.is_set():
+            try:
+                pieces.put(piece, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    ingestion = asyncio.create_task(run_in_threadpool(rag_.ingest, read_pieces(), source, metadata_))
+    ingestion.add_done_callback(lambda _: aborted.set())
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        async for data in request.stream():
+            if aborted.is_set():
+                break
+            await run_in_threadpool(put_piece, decoder.decode(data))
+        await run_in_threadpool(put_piece, decoder.decode(b"", final=True))
+    except BaseException:
+        await run_in_threadpool(put_piece, incomplete)
+        await asyncio.gather(ingestion, return_exceptions=True)
+        raise
+    await run_in_threadpool(put_piece, None)
+
+    try:
+        progress = await ingestion
+    except ConnectionError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Vector database connection error: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Error saving document stream: {e}")
+        print_exc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+    return StreamSaveResponse(
+        success=True,
+        message=f"Document saved successfully",
+        chunks=progress.chunks,
+        upserted=progress.upserted,
+        skipped=progress.skipped,
+        deleted=progress.deleted
+    )
@@ -0,0 +1,187 @@
+"""
+Request tracing and Prometheus metrics.
+
+`stage` times a step of a request: the duration goes into a histogram and into the
+breakdown of the request being served, which `RequestMetricsMiddleware` logs as one
+JSON line together with the request ID once the response is complete. The trace
+lives in a context variable, so tasks and threadpool calls started by the request
+add to it as well.
+"""
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "x-request-id"
+# Endpoint label of requests matching no route, their raw paths would make the label set unbounded
+UNMATCHED_ENDPOINT = "unmatched"
+
+REGISTRY = CollectorRegistry()
+
+REQUEST_SECONDS = Histogram(
+    "jargone_request_seconds", "Time to serve a request, streamed bodies included",
+    ["endpoint", "status"], registry=REGISTRY
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "jargone_requests_in_flight", "Requests being served", ["endpoint"], registry=REGISTRY
+)
+STAGE_SECONDS = Histogram(
+    "jargone_stage_seconds", "Time spent in a stage of a request", ["stage"], registry=REGISTRY,
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+PROMPT_TOKENS = Histogram(
+    "jargone_prompt_tokens", "Tokens of the assembled user prompt", registry=REGISTRY,
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 8000, 16000, 32000)
+)
+LLM_TOKENS = Counter(
+    "jargone_llm_tokens", "Tokens reported by the completion API", ["kind"], registry=REGISTRY
+)
+
+
+class RequestTrace:
+    """Request ID and accumulated stage durations of a request."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage_name: str, seconds: float) -> None:
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+
+_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as a stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+
+
+def record_usage(usage: Any) -> None:
+    """Count the tokens of a completion from its usage report, if any."""
+    if usage is None:
+        return
+    LLM_TOKENS.labels("prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached:
+        LLM_TOKENS.labels("cached_prompt").inc(cached)
+
+
+def route_template(scope) -> str:
+    """Path template of the route a request matches, e.g. /items/{id}, the same for every request to it."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return UNMATCHED_ENDPOINT
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware assigning request IDs, tracking in-flight requests and logging stage breakdowns."""
+
+    def __init__(self, app, skip_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1") or uuid.uuid4().hex
+        trace = RequestTrace(request_id)
+        token = _trace.set(trace)
+        endpoint = route_template(scope)
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))]}
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.labels(endpoint).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+            REQUEST_SECONDS.labels(endpoint, str(status)).observe(elapsed)
+            logger.info(json.dumps({
+                "event": "request",
+                "request_id": request_id,
+                "method": scope.get("method"),
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 2),
+                "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in trace.stages.items()},
+            }))
+            _trace.reset(token)
+
+
+class RagCollector:
+    """Exposes the counters kept by the caches and the request coalescing of a Rag instance."""
+
+    def __init__(self, get_rag: Callable[[], Any]):
+        self.get_rag = get_rag
+
+    def collect(self):
+        rag = self.get_rag()
+        if rag is None:
+            return
+        cache = CounterMetricFamily("jargone_cache_requests", "Cache lookups by result", labels=["cache", "result"])
+        explanation = rag.explanation_cache.stats
+        cache.add_metric(["explanation", "hit"], explanation["hits"])
+        cache.add_metric(["explanation", "miss"], explanation["misses"])
+        embedding = rag.embedding_cache.stats
+        cache.add_metric(["embedding", "memory_hit"], embedding["memory_hits"])
+        cache.add_metric(["embedding", "disk_hit"], embedding["disk_hits"])
+        cache.add_metric(["embedding", "miss"], embedding["misses"])
+        yield cache
+
+        inflight = rag.inflight.stats
+        explanations = CounterMetricFamily("jargone_explanations", "Explanations by how they were produced", labels=["source"])
+        explanations.add_metric(["generated"], inflight["executions"])
+        explanations.add_metric(["coalesced"], inflight["coalesced"])
+        yield explanations
+        yield GaugeMetricFamily("jargone_explanations_in_flight", "Distinct explanations being generated", value=inflight["in_flight"])
+
+
+_rag_collector: Optional[RagCollector] = None
+
+
+def register_rag(get_rag: Callable[[], Any]) -> None:
+    """Expose the cache and coalescing counters of the Rag returned by get_rag, replacing a previous registration."""
+    global _rag_collector
+    if _rag_collector is not None:
+        REGISTRY.unregister(_rag_collector)
+    _rag_collector = RagCollector(get_rag)
+    REGISTRY.register(_rag_collector)
@@ -1,8 +1,23 @@
 from pydantic import BaseModel
 from spacy_download import load_spacy
+import spacy
 from spacy import Language
-from typing import List
+from spacy.tokens import Doc
+from typing import Iterable, List, Literal, Optional
+from .jargon import JARGON_ENTITY_TYPE, JargonMatcher
 import logging
+import os
+
+DEFAULT_SPACY_MODEL = 'en_core_web_md'
+ENTITY_LABELS = ['PRODUCT','ORG','PERSON','FAC','WORK_OF_ART','EVENT']
+# Components the entity filter relies on: `ner` for spans, the rest for `lemma_`.
+REQUIRED_COMPONENTS = ['tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer', 'ner']
+
+NER_BATCH_SIZE: int = int(os.getenv("NER_BATCH_SIZE", "32"))
+NER_N_PROCESS: int = int(os.getenv("NER_N_PROCESS", "1"))
+# "spacy": entities of the statistical model, "dictionary": dictionary terms found with the
+# tokenizer only, the model is not even loaded, "both": dictionary terms and the entities around them
+NER_MODE: str = os.getenv("NER_MODE", "both")
 
 class NamedEntity(BaseModel):
     text: str
@@ -12,24 +27,70 @@ class NamedEntity(BaseModel):
 
 class EntityRecognition():
     model: Language
-    
-    def __init__(self):
-        self.model = load_spacy('en_core_web_md')
-        
-        
+    jargon: Optional[JargonMatcher] = None
+
+    def __init__(self, model_name: str = DEFAULT_SPACY_MODEL, mode: Literal['spacy', 'dictionary', 'both'] = NER_MODE):
+        if mode not in ('spacy', 'dictionary', 'both'):
+            raise ValueError(f"Unknown NER mode: {mode}")
+        self.mode = mode
+        self.model = spacy.blank("en") if mode == 'dictionary' else load_spacy(model_name)
+        self.disabled_components = [name for name in self.model.pipe_names if name not in REQUIRED_COMPONENTS]
+
+    def use_jargon(self, names: Iterable[str]) -> None:
+        """Compile the dictionary terms to detect, replacing the previous ones. Has no effect in spacy mode."""
+        if self.mode != 'spacy':
+            jargon = JargonMatcher(names, self.model)
+            self.jargon = jargon
+            logging.info(f"Jargon matcher compiled: {len(jargon)} terms")
+
+    def warmup(self) -> None:
+        """Run a short text through the pipeline so the first request does not pay for lazy initialization."""
+        self._analyze("Warmup sentence about the Jargone API by SMOG Devs.")
+
     def extract_named_entities(self, text: str) -> List[NamedEntity]:
-        elements = []
-        result = self.model(text)
+        return self._collect_entities(self._analyze(text))
+
+    def extract_named_entities_batch(self, texts: Iterable[str], batch_size: int = NER_BATCH_SIZE, n_process: int = NER_N_PROCESS) -> List[List[NamedEntity]]:
+        """
+        Extract named entities from many texts with spaCy's batched pipeline.
+
+        Args:
+            texts: Texts to process
+            batch_size: Number of texts spaCy buffers per batch
+            n_process: Number of worker processes, -1 uses all cores, ignored in dictionary mode
+
+        Returns:
+            Named entities of each text, in input order
+        """
+        if self.mode == 'dictionary':
+            results = self.model.tokenizer.pipe(texts, batch_size=batch_size)
+        else:
+            results = self.model.pipe(texts, batch_size=batch_size, n_process=n_process, disable=self.disabled_components)
+        return [self._collect_entities(result) for result in results]
+
+    def _analyze(self, text: str) -> Doc:
+        if self.mode == 'dictionary':
+            return self.model.make_doc(text)
+        return self.model(text, disable=self.disabled_components)
+
+    def _collect_entities(self, result: Doc) -> List[NamedEntity]:
+        jargon = self.jargon
+        elements = [
+            NamedEntity(text=name, start=start, stop=stop, type=JARGON_ENTITY_TYPE)
+            for name, start, stop in (jargon.find(result) if jargon is not None else [])
+        ]
+        if self.mode == 'dictionary':
+            return elements
+
+        # Dictionary terms take precedence over the entities they overlap
+        taken = {i for element in elements for i in range(element.start, element.stop)}
         for result_ in result.ents:
             logging.info(f"Entity: {result_.lemma_}-{result_.label_}")
-            if result_.label_ in ['PRODUCT','ORG','PERSON','FAC','WORK_OF_ART','EVENT']:
+            if result_.label_ in ENTITY_LABELS and not taken.intersection(range(result_.start, result_.end)):
                 elements.append(
                   NamedEntity(text=result_.lemma_.lower(),
                             start=result_.start,
                             stop=result_.end,
-                            type=result_.label_.lower())   
+                            type=result_.label_.lower())
                 )
-        return elements
-    
-            
-        
\ No newline at end of file
+        return sorted(elements, key=lambda element: element.start)
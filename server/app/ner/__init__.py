@@ -11,4 +11,12 @@ The NER process typically involves the following steps:
 
 3. **Output**:
    - The named entities are returned to the user with its definitions from the knowledge base.
-"""
\ No newline at end of file
+
+Dictionary terms are detected with `jargon.JargonMatcher`, alongside the spaCy entities or instead
+of them, as set by NER_MODE ("both", "dictionary" or "spacy").
+
+The loaded spaCy pipeline is shared by the whole process, use `get_entity_recognition` instead of creating `EntityRecognition` directly.
+"""
+from .registry import get_entity_recognition
+
+__all__ = ["get_entity_recognition"]
\ No newline at end of file
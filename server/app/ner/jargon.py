@@ -0,0 +1,122 @@
+"""
+Dictionary-driven jargon detection.
+
+The statistical NER only tags names of products, organizations and the like, most
+dictionary terms ("access point", "accessibility") are never entities. `JargonMatcher`
+instead compiles every dictionary term, and the aliases in its name such as the
+abbreviation in "learning management system (lms)", into a trie over normalized
+tokens and finds the leftmost-longest terms of a tokenized text in a single pass.
+It only needs spaCy's tokenizer, so offsets are the token indices `Entity.start/stop`
+use elsewhere.
+"""
+import re
+from typing import Iterable, List, Optional, Tuple
+import spacy
+from spacy import Language
+from spacy.tokens import Doc
+
+JARGON_ENTITY_TYPE = "jargon"
+# Aliases shorter than this ("k" in "kilobyte (k, kb, or kb)") match too much
+MIN_ALIAS_LENGTH = 2
+
+_END = None
+_PARENTHESIS = re.compile(r"\(([^)]*)\)")
+_ALTERNATIVES = re.compile(r",\s*(?:or\s+)?|\s+or\s+")
+
+
+def normalize(word: str) -> str:
+    """Lowercase a word and reduce regular plurals to the singular, the same way for terms and text."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def term_aliases(name: str) -> List[str]:
+    """
+    Spellings of a dictionary term found in its name.
+
+    "gigabyte (gig or gb)" gives gigabyte, gig and gb, "cd-rw, cd-r disk" gives cd-rw and
+    cd-r disk. A parenthesis is only read as aliases when they are abbreviations or share
+    a word with the term, "wireless (networking)" is just wireless.
+    """
+    aliases = [name]
+    base = _PARENTHESIS.sub(" ", name)
+    base_words = set(base.split())
+    aliases.extend(_ALTERNATIVES.split(base))
+    for inner in _PARENTHESIS.findall(name):
+        for alias in _ALTERNATIVES.split(inner):
+            words = alias.split()
+            if (len(words) == 1 and len(alias) <= 5) or base_words & set(words):
+                aliases.append(alias)
+    return list(dict.fromkeys(
+        alias.strip() for alias in aliases if len(alias.strip()) >= MIN_ALIAS_LENGTH
+    ))
+
+
+class JargonMatcher:
+    """Finds dictionary terms in tokenized text."""
+
+    def __init__(self, names: Iterable[str], nlp: Optional[Language] = None):
+        """
+        Compile the terms.
+
+        Args:
+            names: Dictionary term names, reported as the text of the matches
+            nlp: Pipeline whose tokenizer splits the terms, it must be the one tokenizing the texts
+        """
+        self.nlp = nlp or spacy.blank("en")
+        self._trie: dict = {}
+        names = list(names)
+        aliases = [(name, alias) for name in names for alias in term_aliases(name)]
+        for (name, _), doc in zip(aliases, self.nlp.tokenizer.pipe(alias for _, alias in aliases)):
+            self._add([normalize(token.text) for token in doc], name)
+        self.size = len(names)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _add(self, tokens: List[str], name: str) -> None:
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # The first term keeps a spelling shared by several
+        node.setdefault(_END, name)
+
+    def find(self, doc: Doc) -> List[Tuple[str, int, int]]:
+        """
+        Find the terms of a text, longest first where they overlap.
+
+        Args:
+            doc: Text tokenized by the matcher's tokenizer or the full pipeline
+
+        Returns:
+            (name, start, stop) token spans, in order
+        """
+        # Line breaks and repeated spaces are tokens of their own, terms match across them
+        positions = [token.i for token in doc if not token.is_space]
+        words = [normalize(doc[i].text) for i in positions]
+        matches = []
+        start = 0
+        while start < len(words):
+            node = self._trie
+            found = None
+            position = start
+            while position < len(words) and words[position] in node:
+                node = node[words[position]]
+                position += 1
+                if _END in node:
+                    found = (node[_END], position)
+            if found is not None:
+                name, end = found
+                matches.append((name, positions[start], positions[end - 1] + 1))
+                start = end
+            else:
+                start += 1
+        return matches
@@ -0,0 +1,54 @@
+"""
+Process-wide registry of loaded spaCy pipelines.
+
+Loading a pipeline takes seconds and hundreds of MB, so every component
+(the API lifespan, document ingestion, scripts) shares one instance per model.
+"""
+import os
+import logging
+import threading
+from typing import Dict, Optional
+from .NamedEntityExtraction import EntityRecognition, DEFAULT_SPACY_MODEL
+
+logger = logging.getLogger(__name__)
+
+_models: Dict[str, EntityRecognition] = {}
+_lock = threading.Lock()
+
+
+def get_entity_recognition(model_name: Optional[str] = None) -> EntityRecognition:
+    """
+    Return the shared EntityRecognition for a model, loading and warming it up on first use.
+
+    Args:
+        model_name: spaCy model to use, defaults to the SPACY_MODEL environment variable
+
+    Returns:
+        The shared EntityRecognition instance
+    """
+    model_name = model_name or os.getenv("SPACY_MODEL", DEFAULT_SPACY_MODEL)
+    ner = _models.get(model_name)
+    if ner is not None:
+        return ner
+
+    with _lock:
+        ner = _models.get(model_name)
+        if ner is None:
+            logger.info(f"Loading spaCy model {model_name}")
+            ner = EntityRecognition(model_name)
+            ner.warmup()
+            _models[model_name] = ner
+    return ner
+
+
+def register_entity_recognition(ner: EntityRecognition, model_name: Optional[str] = None) -> None:
+    """
+    Use an already built pipeline for a model, e.g. one loaded elsewhere or a stand-in for benchmarks.
+
+    Args:
+        ner: Pipeline returned by get_entity_recognition for the model from now on
+        model_name: spaCy model it stands for, defaults to the SPACY_MODEL environment variable
+    """
+    model_name = model_name or os.getenv("SPACY_MODEL", DEFAULT_SPACY_MODEL)
+    with _lock:
+        _models[model_name] = ner
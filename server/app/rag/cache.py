@@ -0,0 +1,139 @@
+"""
+Response cache for explanations.
+
+The cache talks to a `CacheBackend`, so a shared store can be plugged in for
+multi-instance deployments; `LocalCacheBackend` is the in-process stand-in.
+Entries are keyed on everything that shapes the answer plus a corpus version,
+which is bumped whenever documents are saved, so stale explanations are never served.
+"""
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+CORPUS_VERSION_KEY = "corpus_version"
+
+
+class CacheBackend(ABC):
+    """Minimal key-value interface a cache store has to provide."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value of a key, or None when missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, optionally expiring after ttl seconds."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a key if present."""
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        """Atomically increment an integer key (missing keys start at 0) and return the new value."""
+
+
+class LocalCacheBackend(CacheBackend):
+    """In-process backend with TTL expiry and LRU eviction."""
+
+    def __init__(self, max_entries: int = 10000):
+        """
+        Initialize the backend.
+
+        Args:
+            max_entries: Maximum number of entries kept before the least recently used are evicted
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, expires_at = self._entries.get(key, (0, None))
+            self._entries[key] = (value + 1, expires_at)
+            return value + 1
+
+
+def normalize_sentence(sentence: str) -> str:
+    """Collapse whitespace so cosmetic differences share a cache entry."""
+    return " ".join(sentence.split())
+
+
+class ExplanationCache:
+    """Cache of generated explanations, invalidated by corpus changes."""
+
+    def __init__(self, backend: CacheBackend, ttl: Optional[float] = 3600, namespace: str = "explanation"):
+        """
+        Initialize the cache.
+
+        Args:
+            backend: Store holding the entries and the corpus version
+            ttl: Lifetime of an entry in seconds, None keeps entries until evicted
+            namespace: Prefix of every key, allows sharing a backend
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def corpus_version(self) -> int:
+        return self.backend.get(f"{self.namespace}:{CORPUS_VERSION_KEY}") or 0
+
+    def key(self, sentence: str, details: str, role: str, ners: List[Tuple[str, str]], model: str = "") -> str:
+        payload = json.dumps(
+            [normalize_sentence(sentence), details, role.strip().lower(), sorted(map(list, ners)), model, self.corpus_version],
+            ensure_ascii=False
+        )
+        return f"{self.namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, explanation: str) -> None:
+        self.backend.set(key, explanation, ttl=self.ttl)
+
+    def invalidate(self) -> int:
+        """Bump the corpus version so every existing entry stops matching."""
+        return self.backend.incr(f"{self.namespace}:{CORPUS_VERSION_KEY}")
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "corpus_version": self.corpus_version}
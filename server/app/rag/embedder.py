@@ -1,17 +1,64 @@
+import asyncio
+import os
 import sys
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI, AsyncOpenAI
+from .tokens import get_encoding
+
+# Provider limits for a single embeddings request
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "300000"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+
+
+def batch_by_tokens(token_counts, max_inputs=EMBEDDING_BATCH_MAX_INPUTS, max_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+    """Group consecutive inputs into batches that respect the per-request limits.
+    
+    Args:
+        token_counts (list): Token count of every input, in order.
+        max_inputs (int): Maximum number of inputs in a batch.
+        max_tokens (int): Maximum total number of tokens in a batch.
+        
+    Returns:
+        list: Batches as lists of input indices.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, count in enumerate(token_counts):
+        if current and (len(current) >= max_inputs or current_tokens + count > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += count
+    if current:
+        batches.append(current)
+    return batches
+
 
 class Embedder:
     """Class for generating embeddings using OpenAI's API."""
     
-    def __init__(self, api_key, model="text-embedding-3-small", dimension=1536):
+    def __init__(self, api_key, model="text-embedding-3-small", dimension=1536, cache=None):
         """Initialize the Embedder with an OpenAI API key.
         
         Args:
             api_key (str): OpenAI API key.
+            model (str): Embedding model name.
+            dimension (int): Dimension of the produced vectors.
+            cache (EmbeddingCache, optional): Cache consulted before calling the API.
         """
         self.client = OpenAI(api_key=api_key)
-        self.model = "text-embedding-3-small"
+        self.async_client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+        self.dimension = int(dimension)
+        self.cache = cache
+
+    @property
+    def encoding(self):
+        """Tokenizer of the embedding model."""
+        return get_encoding(self.model)
     
     def embed_text(self, text):
         """Generate embedding for a single text string.
@@ -22,11 +69,43 @@ class Embedder:
         Returns:
             list: The embedding vector.
         """
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
         response = self.client.embeddings.create(
             input=text,
-            model=self.model
+            model=self.model,
+            dimensions=self.dimension
         )
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        if self.cache is not None:
+            self.cache.put(text, embedding)
+        return embedding
+
+    async def aembed_text(self, text):
+        """Generate embedding for a single text string without blocking the event loop.
+        
+        Args:
+            text (str): The text to embed.
+            
+        Returns:
+            list: The embedding vector.
+        """
+        # The cache may read and write its disk tier, which is kept off the event loop
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, text)
+            if cached is not None:
+                return cached
+        response = await self.async_client.embeddings.create(
+            input=text,
+            model=self.model,
+            dimensions=self.dimension
+        )
+        embedding = response.data[0].embedding
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, text, embedding)
+        return embedding
     
     def embed_batch(self, texts):
         """Generate embeddings for a batch of texts.
@@ -37,12 +116,105 @@ class Embedder:
         Returns:
             list: List of embedding vectors.
         """
+        return self._embed_cached(texts, self._create_embeddings)
+
+    async def aembed_batch(self, texts, max_concurrency=EMBEDDING_MAX_CONCURRENCY):
+        """Generate embeddings for any number of texts without blocking the event loop.
+        
+        Texts are batched like in embed_documents, the cache is consulted from a worker thread.
+        
+        Args:
+            texts (list): List of text strings to embed.
+            max_concurrency (int): Maximum number of requests in flight.
+            
+        Returns:
+            list: List of embedding vectors, in input order.
+        """
+        embeddings, missing = await asyncio.to_thread(self._lookup_cached, texts)
+        if not missing:
+            return embeddings
+        computed = await self._aembed_in_batches(missing, max_concurrency)
+        return await asyncio.to_thread(self._merge_computed, texts, embeddings, missing, computed)
+
+    def embed_documents(self, texts, max_concurrency=EMBEDDING_MAX_CONCURRENCY):
+        """Generate embeddings for any number of texts.
+        
+        Texts are grouped into batches within the provider's per-request input
+        and token limits, and up to max_concurrency batches are sent at once.
+        
+        Args:
+            texts (list): List of text strings to embed.
+            max_concurrency (int): Maximum number of requests in flight.
+            
+        Returns:
+            list: List of embedding vectors, in input order.
+        """
+        if not texts:
+            return []
+        return self._embed_cached(texts, lambda missing: self._embed_in_batches(missing, max_concurrency))
+
+    def _create_embeddings(self, texts):
+        """Send one embeddings request, bypassing the cache."""
         response = self.client.embeddings.create(
             input=texts,
-            model=self.model
+            model=self.model,
+            dimensions=self.dimension
         )
         return [item.embedding for item in response.data]
 
+    def _embed_in_batches(self, texts, max_concurrency):
+        """Send token-bounded batches concurrently, bypassing the cache."""
+        token_counts = [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+        batches = batch_by_tokens(token_counts, EMBEDDING_BATCH_MAX_INPUTS, EMBEDDING_BATCH_MAX_TOKENS)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(batches)))) as executor:
+            results = executor.map(lambda batch: self._create_embeddings([texts[i] for i in batch]), batches)
+            return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    async def _acreate_embeddings(self, texts):
+        """Send one embeddings request without blocking, bypassing the cache."""
+        response = await self.async_client.embeddings.create(
+            input=texts,
+            model=self.model,
+            dimensions=self.dimension
+        )
+        return [item.embedding for item in response.data]
+
+    async def _aembed_in_batches(self, texts, max_concurrency):
+        """Send token-bounded batches concurrently without blocking, bypassing the cache."""
+        token_counts = [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+        batches = batch_by_tokens(token_counts, EMBEDDING_BATCH_MAX_INPUTS, EMBEDDING_BATCH_MAX_TOKENS)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def send(batch):
+            async with semaphore:
+                return await self._acreate_embeddings([texts[i] for i in batch])
+
+        results = await asyncio.gather(*[send(batch) for batch in batches])
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    def _embed_cached(self, texts, embed_missing):
+        """Serve texts from the cache and embed only the distinct misses."""
+        embeddings, missing = self._lookup_cached(texts)
+        if not missing:
+            return embeddings
+        return self._merge_computed(texts, embeddings, missing, embed_missing(missing))
+
+    def _lookup_cached(self, texts):
+        """Return cached embeddings (None for misses) and the distinct texts still to embed."""
+        if self.cache is None:
+            return [None] * len(texts), list(texts)
+        embeddings = [self.cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        return embeddings, missing
+
+    def _merge_computed(self, texts, embeddings, missing, computed_embeddings):
+        """Store freshly computed embeddings and fill the gaps left by cache misses."""
+        computed = dict(zip(missing, computed_embeddings))
+        if self.cache is not None:
+            for text, embedding in computed.items():
+                self.cache.put(text, embedding)
+        return [embedding if embedding is not None else computed[text] for text, embedding in zip(texts, embeddings)]
+
 
 if __name__ == "__main__":
     # Example usage from command line
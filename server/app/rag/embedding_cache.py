@@ -0,0 +1,191 @@
+"""
+Content-addressed cache for embeddings.
+
+Entries are keyed by (model, dimension, normalized text) and kept in two tiers:
+a bounded in-memory LRU and an optional append-only store on disk
+(a memory-mapped float32 matrix plus a key index) that survives restarts and
+can be shared by several worker processes.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic differences map to the same entry."""
+    return " ".join(text.split())
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only float32 matrix on disk with a key -> row index.
+
+    Appends hold an exclusive lock on the index file and take their row from the
+    size of the matrix file, so workers sharing the directory never write the same
+    row and see each other's entries.
+    """
+
+    def __init__(self, path: str, dimension: int):
+        """
+        Open or create the store.
+
+        Args:
+            path: Directory holding the store files
+            dimension: Dimension of the stored vectors
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.row_size = dimension * np.dtype(np.float32).itemsize
+        self.vectors_path = self.path / f"vectors-{dimension}.f32"
+        self.index_path = self.path / f"index-{dimension}.txt"
+        self.vectors_path.touch(exist_ok=True)
+        self.index_path.touch(exist_ok=True)
+        self.rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._matrix: Optional[np.memmap] = None
+
+        with self._locked():
+            # A vector that was not fully written is dropped, so later appends stay aligned
+            stored_rows = self.vectors_path.stat().st_size // self.row_size
+            with self.vectors_path.open("r+b") as f:
+                f.truncate(stored_rows * self.row_size)
+            self._read_index()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the store's lock, shared by every process using the directory."""
+        with self.index_path.open("a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_index(self) -> None:
+        """Pick up the index entries appended since the last read, by this process or others."""
+        with self.index_path.open("rb") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                # A line still being written is read again next time
+                if not line.endswith(b"\n"):
+                    break
+                self._index_offset += len(line)
+                key, _, row = line.decode().strip().partition(" ")
+                if row:
+                    self.rows.setdefault(key, int(row))
+
+    def get(self, key: str) -> Optional[List[float]]:
+        row = self.rows.get(key)
+        if row is None:
+            self._read_index()
+            row = self.rows.get(key)
+            if row is None:
+                return None
+        if self._matrix is None or row >= self._matrix.shape[0]:
+            stored_rows = self.vectors_path.stat().st_size // self.row_size
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(stored_rows, self.dimension))
+        return self._matrix[row].tolist()
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        if key in self.rows:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dimension,):
+            raise ValueError(f"Expected embedding of dimension {self.dimension}, got {vector.shape}")
+        with self._locked():
+            self._read_index()
+            if key in self.rows:
+                return
+            with self.vectors_path.open("ab") as f:
+                row = f.seek(0, os.SEEK_END) // self.row_size
+                f.write(vector.tobytes())
+            with self.index_path.open("a") as f:
+                f.write(f"{key} {row}\n")
+        self.rows[key] = row
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache with hit/miss counters."""
+
+    def __init__(self, model: str, dimension: int, max_memory_entries: int = 10000, cache_dir: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            model: Embedding model name, part of every key
+            dimension: Embedding dimension, part of every key
+            max_memory_entries: Capacity of the in-memory LRU tier
+            cache_dir: Directory of the disk tier, the disk tier is disabled when None
+        """
+        self.model = model
+        self.dimension = int(dimension)
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._disk = DiskEmbeddingStore(cache_dir, self.dimension) if cache_dir else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model}\x00{self.dimension}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding of a text, or None on a miss."""
+        key = self.key(text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return embedding
+            if self._disk is not None:
+                embedding = self._disk.get(key)
+                if embedding is not None:
+                    self._remember(key, embedding)
+                    self.disk_hits += 1
+                    return embedding
+            self.misses += 1
+            return None
+
+    def put(self, text: str, embedding: List[float]) -> None:
+        """Store the embedding of a text in both tiers."""
+        key = self.key(text)
+        with self._lock:
+            self._remember(key, embedding)
+            if self._disk is not None:
+                try:
+                    self._disk.put(key, embedding)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Failed to persist embedding: {e}")
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes."""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk) if self._disk is not None else 0,
+        }
@@ -1,7 +1,12 @@
+from typing import Dict, List
 from rag.embedder import Embedder
-from data.vector import QdrantVectorDB, DocumentChunk
+from data.vector import QdrantVectorDB
 import json
-from ingestion.doc import Document
+from ingestion.chunker import TokenChunker
+from ingestion.doc import DOC_MAX_CHUNK_SIZE, DOC_CHUNK_OVERLAP
+from ingestion.pipeline import IngestionPipeline
+from ner.registry import get_entity_recognition
+from data.dictionary import read_dictionary
 
 # Load the context
 with open("app/rag/context.json", "r") as f:
@@ -13,22 +18,22 @@ embedder = Embedder(api_key="sk-proj-1wNhHNxBJBnqAV2JMJFA5cHaP7s5Totl-tASWX4SNxV
 
 
 # CreateDocument 
-chunks = []
+ner = get_entity_recognition()
+ner.use_jargon(name for name, _ in read_dictionary())
+sources: Dict[str, List[str]] = {}
 for doc_json in context["context"]:
-    doc = Document(doc_json["content"], doc_json["metadata"]["source"])
-    chunks.extend(doc.chunkize())   
+    sources.setdefault(doc_json["metadata"]["source"], []).append(doc_json["content"])
 
 
-documents = []
-for i, chunk in enumerate(chunks):
-    embedding = embedder.embed_text(chunk.text)
-    doc = DocumentChunk(text=chunk.text, embedding=embedding, id=i+100)
-    print(doc)
-    documents.append(doc)
-
-
-
-# Add the embeddings to the Qdrant database
 qdrant_db = QdrantVectorDB(collection_name="documents", host="vector-server", port=6333, embedding_dim=1536)
-qdrant_db.add_documents(documents)
 
+# Every source goes through the ingestion pipeline as one document: chunks stored by a
+# previous run are skipped, and the ones no longer in the context are deleted
+pipeline = IngestionPipeline(
+    embedder=embedder,
+    vector_db=qdrant_db,
+    chunker=TokenChunker(DOC_MAX_CHUNK_SIZE, DOC_CHUNK_OVERLAP, model=embedder.model),
+    ner=ner
+)
+for source_name, contents in sources.items():
+    print(pipeline.run(["\n\n".join(contents)], source_name))
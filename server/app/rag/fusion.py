@@ -0,0 +1,29 @@
+"""
+Rank fusion of retrieval results.
+
+Reciprocal rank fusion only looks at positions, so rankings with incomparable
+scores (e.g. an unfiltered vector search and an entity-filtered one) can be merged.
+"""
+from typing import Any, Dict, List
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merge rankings of search results by the sum of 1 / (k + rank) over the rankings a result appears in.
+
+    Args:
+        rankings: Search results, best first, identified by their "id"
+        k: Damping constant, higher values flatten the difference between ranks
+
+    Returns:
+        Distinct results ordered by fused score, ties keep the order of the first ranking,
+        each with its score under "fused_score"
+    """
+    scores: Dict[str, float] = {}
+    records: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, record in enumerate(ranking, start=1):
+            scores[record["id"]] = scores.get(record["id"], 0.0) + 1.0 / (k + rank)
+            records.setdefault(record["id"], record)
+    ordered = sorted(scores, key=lambda record_id: -scores[record_id])
+    return [{**records[record_id], "fused_score": scores[record_id]} for record_id in ordered]
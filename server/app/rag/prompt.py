@@ -0,0 +1,96 @@
+"""
+Prompt assembly under a token budget.
+
+The system prompt never changes between requests, so providers can cache it as a
+prefix. Everything request-specific goes into the user message, serialized as compact
+JSON and trimmed to a token budget: dictionary definitions first, then the retrieved
+sources in rank order, the last one cut at a token boundary if it only partly fits.
+"""
+import json
+import os
+from typing import Any, List, Tuple
+from pydantic import BaseModel
+
+PROMPT_MAX_TOKENS: int = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))
+# A source cut shorter than this is left out rather than included as a fragment
+PROMPT_MIN_CONTEXT_TOKENS: int = int(os.getenv("PROMPT_MIN_CONTEXT_TOKENS", "64"))
+
+
+class Prompt(BaseModel):
+    """User message of a request with its size."""
+    text: str
+    tokens: int
+    contexts_used: int
+    contexts_total: int
+    truncated: bool = False
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def build_prompt(
+    sentence: str,
+    contexts: List[str],
+    ners: List[Tuple[str, str]],
+    details: str,
+    role: str,
+    encoding,
+    max_tokens: int = PROMPT_MAX_TOKENS,
+    min_context_tokens: int = PROMPT_MIN_CONTEXT_TOKENS
+) -> Prompt:
+    """
+    Build the user message for a request within a token budget.
+
+    Args:
+        sentence: Sentence to explain, always included
+        contexts: Retrieved sources, best first
+        ners: (name, definition) pairs from the dictionary
+        details: Details level
+        role: End user role
+        encoding: Tokenizer of the completion model
+        max_tokens: Token budget of the whole message
+        min_context_tokens: Shortest cut of a source worth including
+
+    Returns:
+        The message and how much of the data made it in
+    """
+    def count(text: str) -> int:
+        return len(encoding.encode_ordinary(text))
+
+    tail = f"\nSentences: {sentence}\nDetails level: {details}\n Role: {role}"
+    used = count("Data:\n" + compact_json({"sources": [], "dictionary": []}) + tail)
+
+    # Each item also costs about one separator token
+    dictionary = []
+    for name, definition in ners:
+        entry = {"name": name, "definition": definition}
+        cost = count(compact_json(entry)) + 1
+        if used + cost > max_tokens:
+            break
+        dictionary.append(entry)
+        used += cost
+
+    sources = []
+    truncated = False
+    for context in contexts:
+        cost = count(compact_json(context)) + 1
+        if used + cost <= max_tokens:
+            sources.append(context)
+            used += cost
+            continue
+        # Room for the quotes and separator aside
+        remaining = max_tokens - used - 3
+        if remaining >= min_context_tokens:
+            sources.append(encoding.decode(encoding.encode_ordinary(context)[:remaining]))
+            truncated = True
+        break
+
+    text = f"Data:\n{compact_json({'sources': sources, 'dictionary': dictionary})}{tail}"
+    return Prompt(
+        text=text,
+        tokens=count(text),
+        contexts_used=len(sources),
+        contexts_total=len(contexts),
+        truncated=truncated
+    )
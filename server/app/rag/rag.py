@@ -1,20 +1,50 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import os
+import asyncio
 import json
+from functools import cached_property
 from pathlib import Path
 import logging
-from typing import List, Tuple, Dict, Any, Optional, Literal
+from typing import List, Tuple, Dict, Any, Optional, Literal, Awaitable, Union, AsyncIterator, Iterable, Callable
 from .embedder import Embedder
-from data.vector import QdrantVectorDB, DocumentChunk
-from uuid import uuid4
-from ingestion.doc import Document
+from .embedding_cache import EmbeddingCache
+from .cache import CacheBackend, ExplanationCache, LocalCacheBackend
+from .fusion import reciprocal_rank_fusion
+from .prompt import PROMPT_MAX_TOKENS, build_prompt
+from .singleflight import SingleFlight
+from metrics import PROMPT_TOKENS, current_request_id, record_usage, stage
+from .tokens import get_encoding
+from data.vector import QdrantVectorDB, DocumentChunk, VectorStore, entity_filter
+from data.local_vector import LocalVectorDB
+from ingestion.doc import DOC_MAX_CHUNK_SIZE, DOC_CHUNK_OVERLAP
+from ingestion.chunker import TokenChunker
+from ingestion.pipeline import IngestionPipeline, IngestionProgress
 
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "10000"))
+EXPLANATION_CACHE_TTL = float(os.getenv("EXPLANATION_CACHE_TTL", "3600"))
+# Retrieval only feeds the chunk text into the prompt, the rest of the payload is not fetched
+CONTEXT_PAYLOAD_FIELDS = ["text"]
+# Contexts retrieved by a plain vector search
+RETRIEVAL_LIMIT = int(os.getenv("RETRIEVAL_LIMIT", "5"))
+# When the request names entities, candidates of the vector search and of the search restricted
+# to chunks mentioning them are fused, which ranks the right chunks high enough to keep fewer
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+HYBRID_RETRIEVAL_LIMIT = int(os.getenv("HYBRID_RETRIEVAL_LIMIT", "3"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# "qdrant" or "local", the local store keeps the vectors in-process under VECTOR_STORE_DIR
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", ".cache/vectors")
+
 class Rag:
     def __init__(self, api_key: str, model: str = "gpt-4o", max_tokens: int = 800, 
                  system_prompt: str = None, context_path: str = "server/app/rag/context.json",
-                 embedder_model: str = "text-embedding-3-small", embedder_dimension: int = 1536):
+                 embedder_model: str = "text-embedding-3-small", embedder_dimension: int = 1536,
+                 cache_backend: Optional[CacheBackend] = None):
         """Initialize the OpenAI connector.
         
         Args:
@@ -22,8 +52,10 @@ class Rag:
             model (str): Model to use for completions
             max_tokens (int): Maximum tokens for response
             system_prompt (str): System prompt to use for the model
+            cache_backend (CacheBackend, optional): Store for cached explanations, in-process by default
         """
         self.client = OpenAI(api_key=api_key)
+        self.async_client = AsyncOpenAI(api_key=api_key)
         self.api_key = api_key
         self.model = model
         self.max_tokens = max_tokens
@@ -38,10 +70,25 @@ class Rag:
                                             'You will be provided with the data in json format: {"sources": [string],"dictionary": [{"name": string, "definition": string},...]}'
                                             'sources field contains data from documentation, while dictionary field contains definitions of terms with their definitions.'
                                             'Focus on rewriting provided sentences according to requirements above. If the data doesn\'t provide informations relevant to the sentences, return False'])
-        self.qdrant_db = QdrantVectorDB(collection_name="documents", host="vector-server", port=6333, embedding_dim=embedder_dimension)
-        self.embedder = Embedder(api_key=api_key, model=embedder_model, dimension=embedder_dimension)
+        self.vector_db = self._create_vector_db(embedder_dimension)
+        self.embedding_cache = EmbeddingCache(model=embedder_model, dimension=embedder_dimension,
+                                              max_memory_entries=EMBEDDING_CACHE_SIZE, cache_dir=EMBEDDING_CACHE_DIR or None)
+        self.embedder = Embedder(api_key=api_key, model=embedder_model, dimension=embedder_dimension, cache=self.embedding_cache)
+        self.explanation_cache = ExplanationCache(cache_backend or LocalCacheBackend(max_entries=EXPLANATION_CACHE_SIZE),
+                                                  ttl=EXPLANATION_CACHE_TTL)
+        # Identical requests arriving while one is being explained wait for its result
+        self.inflight = SingleFlight()
 
         
+    @staticmethod
+    def _create_vector_db(embedding_dim: int) -> VectorStore:
+        """Open the vector store selected by VECTOR_BACKEND."""
+        if VECTOR_BACKEND == "local":
+            return LocalVectorDB(VECTOR_STORE_DIR, embedding_dim=embedding_dim)
+        if VECTOR_BACKEND == "qdrant":
+            return QdrantVectorDB(collection_name="documents", embedding_dim=embedding_dim)
+        raise ValueError(f"Unknown vector backend: {VECTOR_BACKEND}")
+
     def _load_context(self, context_path: str) -> str:
         """Load context from the context.json file."""
         try:
@@ -53,17 +100,41 @@ class Rag:
             logger.error(f"Failed to load context: {e}")
             return ""
             
+    @property
+    def encoding(self):
+        """Tokenizer of the completion model, loaded on first use."""
+        return get_encoding(self.model)
+
+    @cached_property
+    def system_prompt_tokens(self) -> int:
+        return len(self.encoding.encode_ordinary(self.system_prompt))
+
+    def warmup(self) -> None:
+        """Load the tokenizers before the first request needs them, the vector store is connected already."""
+        self.embedder.encoding
+        self.system_prompt_tokens
+
     def get_prompt(self, sentence: str, contexts: List[str], ners: List[Tuple[str,str]], details: Literal['detailed','basic'], role: str) -> str:
-        """Generate a prompt for the OpenAI model.
+        """Generate a prompt for the OpenAI model, trimmed to PROMPT_MAX_TOKENS.
         
         Args:
-            request (str): The user's request
+            sentence (str): The user's request
+            contexts (List[str]): Retrieved contexts, best first
+            ners (List[Tuple[str,str]]): Dictionary definitions of the named entities
+            details (str): Details level
+            role (str): End user role
 
         Returns:
             str: Formatted prompt
         """
-        data = {'sources': contexts, "dictionary": [{'name': ner[0], 'definition': ner[1]} for ner in ners]}
-        return f"Data:\n{json.dumps(data,ensure_ascii=False,indent=4)}\nSentences: {sentence}\nDetails level: {details}\n Role: {role}"
+        with stage("prompt"):
+            prompt = build_prompt(sentence, contexts, ners, details, role, self.encoding, PROMPT_MAX_TOKENS)
+        PROMPT_TOKENS.observe(prompt.tokens)
+        logger.info(
+            f"[{current_request_id()}] Prompt tokens: system={self.system_prompt_tokens} user={prompt.tokens}, "
+            f"contexts {prompt.contexts_used}/{prompt.contexts_total}{' (last truncated)' if prompt.truncated else ''}"
+        )
+        return prompt.text
         
         
     def get_completion(self, prompt: str) -> str:
@@ -79,19 +150,84 @@ class Rag:
             Exception: If the API call fails
         """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=self.max_tokens,
-                temperature=0.3
-            )
+            with stage("completion"):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=self.max_tokens,
+                    temperature=0.3
+                )
+            record_usage(response.usage)
+            return response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"OpenAI API call failed: {e}")
+            raise
+
+    async def aget_completion(self, prompt: str) -> str:
+        """Get completion from OpenAI model without blocking the event loop.
+        
+        Args:
+            prompt (str): The prompt to send to the model
+            
+        Returns:
+            str: Model's response
+            
+        Raises:
+            Exception: If the API call fails
+        """
+        try:
+            with stage("completion"):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=self.max_tokens,
+                    temperature=0.3
+                )
+            record_usage(response.usage)
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"OpenAI API call failed: {e}")
             raise
+
+    async def astream_completion(self, prompt: str) -> AsyncIterator[str]:
+        """Stream completion from OpenAI model as it is generated.
+        
+        Args:
+            prompt (str): The prompt to send to the model
+            
+        Yields:
+            str: Pieces of the model's response
+            
+        Raises:
+            Exception: If the API call fails
+        """
+        try:
+            with stage("completion"):
+                stream = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=self.max_tokens,
+                    temperature=0.3,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    # The last chunk carries the usage and no choices
+                    record_usage(getattr(chunk, "usage", None))
+        except Exception as e:
+            logger.error(f"OpenAI API call failed: {e}")
+            raise
             
     def process_request(self, request: str, explanationLevel: Literal['detailed','basic'], userRole: str, additionalContext: str, ners: List[Tuple[str,str]]) -> str:
         """Process a request through the OpenAI model.
@@ -102,13 +238,93 @@ class Rag:
         Returns:
             str: Model's response
         """
+        cache_key = self.explanation_cache.key(request, explanationLevel, userRole, ners, self.model)
+        cached = self.explanation_cache.get(cache_key)
+        if cached is not None:
+            return cached
         contexts = self._search_context(request)
         prompt = self.get_prompt(request, contexts,ners,explanationLevel,userRole)
-        logging.info(f"Prompt: {prompt}")
+        logger.debug(f"Prompt: {prompt}")
         return_sentence = self.get_completion(prompt)
         if 'False' in return_sentence:
-            return request
+            return_sentence = request
+        self.explanation_cache.set(cache_key, return_sentence)
         return return_sentence
+
+    async def aprocess_request(self, request: str, explanationLevel: Literal['detailed','basic'], userRole: str, additionalContext: str, ners: List[Tuple[str,str]], contexts: Optional[Union[List[str], Awaitable[List[str]]]] = None) -> str:
+        """Process a request through the OpenAI model without blocking the event loop.
+        
+        Args:
+            request (str): The user's request
+            contexts (optional): Already retrieved contexts or a pending retrieval task, searched for when omitted.
+                A pending task is cancelled when the explanation is served from the cache or by an identical
+                request already in flight.
+
+        Returns:
+            str: Model's response
+        """
+        cache_key = self.explanation_cache.key(request, explanationLevel, userRole, ners, self.model)
+        cached = self.explanation_cache.get(cache_key)
+        if cached is not None or cache_key in self.inflight:
+            # This request's own retrieval will not be used
+            if isinstance(contexts, asyncio.Future):
+                contexts.cancel()
+        if cached is not None:
+            return cached
+        return await self.inflight.run(
+            cache_key,
+            lambda: self._agenerate_explanation(request, explanationLevel, userRole, ners, contexts, cache_key)
+        )
+
+    async def _agenerate_explanation(self, request: str, explanationLevel: Literal['detailed','basic'], userRole: str, ners: List[Tuple[str,str]], contexts: Optional[Union[List[str], Awaitable[List[str]]]], cache_key: str) -> str:
+        """Retrieve, prompt and complete an explanation that is not cached, then cache it."""
+        contexts = await self._aresolve_contexts(request, contexts)
+        prompt = self.get_prompt(request, contexts,ners,explanationLevel,userRole)
+        logger.debug(f"Prompt: {prompt}")
+        return_sentence = await self.aget_completion(prompt)
+        if 'False' in return_sentence:
+            return_sentence = request
+        self.explanation_cache.set(cache_key, return_sentence)
+        return return_sentence
+
+    async def astream_request(self, request: str, explanationLevel: Literal['detailed','basic'], userRole: str, additionalContext: str, ners: List[Tuple[str,str]], contexts: Optional[Union[List[str], Awaitable[List[str]]]] = None) -> AsyncIterator[Tuple[str, str]]:
+        """Process a request through the OpenAI model, streaming the response.
+        
+        Args:
+            request (str): The user's request
+            contexts (optional): Same as in aprocess_request
+
+        Yields:
+            tuple: ("token", piece) events as the model generates them, then a single ("done", explanation)
+                with the final explanation, which replaces the streamed text if the model found nothing relevant
+        """
+        cache_key = self.explanation_cache.key(request, explanationLevel, userRole, ners, self.model)
+        cached = self.explanation_cache.get(cache_key)
+        if cached is not None:
+            if isinstance(contexts, asyncio.Future):
+                contexts.cancel()
+            yield "done", cached
+            return
+        contexts = await self._aresolve_contexts(request, contexts)
+        prompt = self.get_prompt(request, contexts,ners,explanationLevel,userRole)
+        logger.debug(f"Prompt: {prompt}")
+        pieces = []
+        async for piece in self.astream_completion(prompt):
+            pieces.append(piece)
+            yield "token", piece
+        return_sentence = ''.join(pieces)
+        if 'False' in return_sentence:
+            return_sentence = request
+        self.explanation_cache.set(cache_key, return_sentence)
+        yield "done", return_sentence
+
+    async def _aresolve_contexts(self, request: str, contexts: Optional[Union[List[str], Awaitable[List[str]]]]) -> List[str]:
+        """Return retrieved contexts, awaiting a pending retrieval or searching when none was given."""
+        if contexts is None:
+            return await self.asearch_context(request)
+        if isinstance(contexts, list):
+            return contexts
+        return await contexts
     
     def _embed_request(self, request: str) -> List[float]:
         """Embed a request using the OpenAI model.
@@ -119,7 +335,8 @@ class Rag:
         Returns:
             list: Embedding of the request
         """
-        return self.embedder.embed_text(request)
+        with stage("embedding"):
+            return self.embedder.embed_text(request)
     
     def _search_context(self, request: str) -> List[str]:
         """Search the context for the most relevant information.
@@ -133,9 +350,106 @@ class Rag:
         # Embed the request
         request_embedding = self._embed_request(request)
         # Search the context
-        results = self.qdrant_db.search(request_embedding)
+        with stage("vector_search"):
+            results = self.vector_db.search(request_embedding, limit=RETRIEVAL_LIMIT, payload_fields=CONTEXT_PAYLOAD_FIELDS)
         return [record['text'] for record in results]
+
+    async def _aembed_request(self, request: str) -> List[float]:
+        """Embed a request using the OpenAI model without blocking the event loop.
+        
+        Args:
+            request (str): The user's request
+
+        Returns:
+            list: Embedding of the request
+        """
+        with stage("embedding"):
+            return await self.embedder.aembed_text(request)
+
+    async def asearch_context(self, request: str, entities: Optional[Union[List[str], Awaitable[List[str]]]] = None) -> List[str]:
+        """Search the context for the most relevant information without blocking the event loop.
+        
+        Args:
+            request (str): The user's request
+            entities (optional): Entities named in the request, or a pending extraction awaited
+                while the request is embedded. Chunks mentioning them are ranked higher.
+
+        Returns:
+            list: List of relevant context
+        """
+        if entities is None or isinstance(entities, list):
+            request_embedding = await self._aembed_request(request)
+        else:
+            request_embedding, entities = await asyncio.gather(self._aembed_request(request), entities)
+        return (await self._asearch_embeddings([request_embedding], [entities or []]))[0]
+    
+    async def asearch_context_batch(self, requests: List[str], entities: Optional[Union[List[List[str]], Awaitable[List[List[str]]]]] = None) -> List[List[str]]:
+        """Search the context for many requests with one embedding call and one vector search.
+        
+        Args:
+            requests (List[str]): The user's requests
+            entities (optional): Entities named in each request, or a pending extraction
+
+        Returns:
+            list: List of relevant context for each request
+        """
+        if entities is None or isinstance(entities, list):
+            request_embeddings = await self._aembed_batch(requests)
+        else:
+            request_embeddings, entities = await asyncio.gather(self._aembed_batch(requests), entities)
+        return await self._asearch_embeddings(request_embeddings, entities or [[] for _ in requests])
+
+    async def _aembed_batch(self, requests: List[str]) -> List[List[float]]:
+        with stage("embedding"):
+            return await self.embedder.aembed_batch(requests)
+
+    async def _asearch_embeddings(self, embeddings: List[List[float]], entities: List[List[str]]) -> List[List[str]]:
+        """Vector search for every embedding, fused with an entity-filtered search where entities are given."""
+        hybrid = [i for i, names in enumerate(entities) if names]
+        with stage("vector_search"):
+            vector_results, *entity_results = await asyncio.gather(
+                self.vector_db.asearch_batch(embeddings, limit=HYBRID_CANDIDATES if hybrid else RETRIEVAL_LIMIT,
+                                             payload_fields=CONTEXT_PAYLOAD_FIELDS),
+                *[
+                    self.vector_db.asearch(embeddings[i], limit=HYBRID_CANDIDATES, filter_condition=entity_filter(entities[i]),
+                                           payload_fields=CONTEXT_PAYLOAD_FIELDS)
+                    for i in hybrid
+                ]
+            )
+        contexts = [[record['text'] for record in records[:RETRIEVAL_LIMIT]] for records in vector_results]
+        for i, entity_records in zip(hybrid, entity_results):
+            fused = reciprocal_rank_fusion([vector_results[i], entity_records], k=RRF_K)
+            contexts[i] = [record['text'] for record in fused[:HYBRID_RETRIEVAL_LIMIT]]
+        return contexts
     
+    def ingest(self, pieces: Iterable[str], source: str, metadata: Dict[str, Any] = None,
+               on_progress: Optional[Callable[[IngestionProgress], None]] = None) -> IngestionProgress:
+        """Stream a document through chunking, NER, embedding and upsert.
+        
+        Args:
+            pieces (Iterable[str]): Consecutive pieces of the document text
+            source (str): Name of the document source
+            metadata (Dict[str, Any], optional): Additional metadata for every chunk
+            on_progress (Callable, optional): Called after every upsert batch
+            
+        Returns:
+            IngestionProgress: Final chunk counts
+        """
+        pipeline = IngestionPipeline(
+            embedder=self.embedder,
+            vector_db=self.vector_db,
+            chunker=TokenChunker(DOC_MAX_CHUNK_SIZE, DOC_CHUNK_OVERLAP, model=self.embedder.model)
+        )
+        progress = None
+        try:
+            progress = pipeline.run(pieces, source, metadata=metadata, on_progress=on_progress)
+            return progress
+        finally:
+            # Explanations generated from the previous corpus are no longer valid,
+            # even a partially ingested document changes it
+            if progress is None or progress.upserted or progress.deleted:
+                self.explanation_cache.invalidate()
+
     def save_document_chunk(self, content: str, source: str, metadata: Dict[str, Any] = None) -> bool:
         """Save a document chunk to the Qdrant database.
         
@@ -147,28 +461,7 @@ class Rag:
             bool: True if successful, False otherwise
         """
         try:
-            doc = Document(content, source)
-
-            chunks = doc.chunkize()
-            documents = []
-            for chunk in chunks:
-                # Generate embedding for the content
-                embedding = self.embedder.embed_text(chunk.text)
-                documents.append(DocumentChunk(
-                    text=chunk.text,
-                    id=str(uuid4()),
-                    embedding=embedding
-                ))
-
-            # # Create a DocumentChunk object
-            # chunk = DocumentChunk(
-            #     text=content,
-            #     id=int(uuid4()),
-            #     embedding=embedding
-            # )
-
-            # Add to Qdrant database
-            self.qdrant_db.add_documents(documents)
+            self.ingest([content], source, metadata)
             
             logger.info(f"Successfully saved document chunks")
             return True
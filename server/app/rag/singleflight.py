@@ -0,0 +1,73 @@
+"""
+Coalescing of identical in-flight work.
+
+Concurrent callers asking for the same key share one execution: the first one starts
+it, the others wait for its result. Failures are shared as well but never remembered,
+the next call after a failure runs again. A caller giving up does not affect the
+others, the execution is only cancelled once nobody is waiting for it anymore.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """Runs at most one execution per key at a time and hands its result to every caller."""
+
+    def __init__(self):
+        # Running execution and number of callers waiting for it, per key
+        self._calls: Dict[str, Tuple[asyncio.Future, int]] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the result of the execution running for a key, starting it when there is none.
+
+        Args:
+            key: Key identifying identical work
+            factory: Creates the awaitable doing the work, only called when a new execution starts
+
+        Returns:
+            Result of the shared execution
+
+        Raises:
+            Exception: The error of the shared execution
+        """
+        if key in self._calls:
+            task, waiters = self._calls[key]
+            self.coalesced += 1
+        else:
+            task, waiters = asyncio.ensure_future(factory()), 0
+            self.executions += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self._calls[key] = (task, waiters + 1)
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if key in self._calls and self._calls[key][0] is task:
+                task, waiters = self._calls[key]
+                if waiters == 1:
+                    # Forgotten right away, a caller arriving before the task finished cancelling starts afresh
+                    del self._calls[key]
+                    task.cancel()
+                else:
+                    self._calls[key] = (task, waiters - 1)
+            raise
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if key in self._calls and self._calls[key][0] is task:
+            del self._calls[key]
+        # Every waiter may have given up before the failure, the error is not worth a warning then
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,23 @@
+"""
+Token counting with tiktoken.
+
+Encodings are loaded lazily and cached, so importing this module does not download anything.
+"""
+from functools import lru_cache
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Return the tiktoken encoding used by a model, falling back to cl100k_base for unknown models."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens of a text as seen by a model."""
+    return len(get_encoding(model).encode_ordinary(text))
@@ -0,0 +1,127 @@
+"""
+Service startup in the background.
+
+The server accepts connections right away while the services it needs are brought
+up: loading the spaCy pipeline, connecting to Postgres and Qdrant and warming them
+up are independent of each other, so every step runs concurrently in the threadpool
+and only the steps needing others wait for them. A failing step, typically a database
+still starting next to the server, is retried with exponential backoff. `/readyz`
+reports the progress, `/healthz` only fails once a step gave up, so the orchestrator
+restarts the container instead of waiting forever.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+STARTUP_ATTEMPTS: int = int(os.getenv("STARTUP_ATTEMPTS", "5"))
+STARTUP_RETRY_SECONDS: float = float(os.getenv("STARTUP_RETRY_SECONDS", "2"))
+
+
+class Startup:
+    """Runs named startup steps concurrently and tracks their state."""
+
+    def __init__(
+        self,
+        steps: Dict[str, Callable[[], Any]],
+        on_ready: Callable[[str, Any], None],
+        depends_on: Optional[Dict[str, List[str]]] = None,
+        attempts: int = STARTUP_ATTEMPTS,
+        retry_seconds: float = STARTUP_RETRY_SECONDS
+    ):
+        """
+        Args:
+            steps: Blocking function per step name, returning the initialized service
+            on_ready: Called on the event loop with the name and result of every step that succeeded
+            depends_on: Steps a step waits for, it fails without running if one of them failed
+            attempts: Tries per step before giving up
+            retry_seconds: Wait before the first retry, doubled after every failure
+        """
+        self.steps = steps
+        self.on_ready = on_ready
+        self.depends_on = depends_on or {}
+        self.attempts = attempts
+        self.retry_seconds = retry_seconds
+        self.state: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending", "attempts": 0, "seconds": None, "error": None} for name in steps
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    @property
+    def ready(self) -> bool:
+        return all(step["status"] == "ready" for step in self.state.values())
+
+    @property
+    def failed(self) -> bool:
+        return any(step["status"] == "failed" for step in self.state.values())
+
+    def start(self) -> asyncio.Task:
+        """Start every step in the background."""
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Cancel the steps still running, a step already inside its blocking function finishes in its thread."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> bool:
+        """
+        Run every step to completion.
+
+        Returns:
+            True if every step succeeded
+        """
+        start = time.perf_counter()
+        self._finished = {name: asyncio.Event() for name in self.steps}
+        await asyncio.gather(*[self._run_step(name) for name in self.steps])
+        if self.ready:
+            logger.info(f"Startup done in {time.perf_counter() - start:.2f}s: " + ", ".join(
+                f"{name} {step['seconds']:.2f}s" for name, step in self.state.items()
+            ))
+        return self.ready
+
+    async def _run_step(self, name: str) -> None:
+        try:
+            for dependency in self.depends_on.get(name, []):
+                await self._finished[dependency].wait()
+                if self.state[dependency]["status"] != "ready":
+                    self.state[name].update(status="failed", error=f"{dependency} failed")
+                    return
+            await self._attempt(name)
+        finally:
+            self._finished[name].set()
+
+    async def _attempt(self, name: str) -> None:
+        step = self.state[name]
+        delay = self.retry_seconds
+        while True:
+            step["status"] = "running"
+            step["attempts"] += 1
+            start = time.perf_counter()
+            try:
+                result = await run_in_threadpool(self.steps[name])
+            except Exception as e:
+                step["error"] = f"{type(e).__name__}: {e}"
+                if step["attempts"] >= self.attempts:
+                    step["status"] = "failed"
+                    logger.error(f"Startup step {name} failed after {step['attempts']} attempts: {e}")
+                    return
+                logger.warning(f"Startup step {name} failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue
+            step["seconds"] = round(time.perf_counter() - start, 3)
+            step["error"] = None
+            self.on_ready(name, result)
+            step["status"] = "ready"
+            return
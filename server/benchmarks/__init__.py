@@ -0,0 +1,14 @@
+"""
+Offline benchmarks of the API.
+
+Run from the `server` directory:
+
+    python -m benchmarks benchmarks/workloads/explain.jsonl --concurrency 16 --output results.json
+
+OpenAI, Qdrant, Postgres and spaCy are replaced by in-process stand-ins (see `fakes`),
+the only thing needed besides the dependencies of the app is the tiktoken encoding,
+downloaded once or provided through TIKTOKEN_CACHE_DIR.
+"""
+from .harness import BenchmarkConfig, WorkloadRequest, load_workload, run_benchmark
+
+__all__ = ["BenchmarkConfig", "WorkloadRequest", "load_workload", "run_benchmark"]
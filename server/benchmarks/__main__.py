@@ -0,0 +1,64 @@
+"""
+Command line entry point, see `python -m benchmarks --help`.
+
+Prints the report as JSON to stdout, or writes it to --output, and a short summary to stderr.
+"""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from .harness import BenchmarkConfig, UpstreamProfile, load_workload, run_benchmark
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = UpstreamProfile()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Replay a workload against the API with in-process upstreams.")
+    parser.add_argument("workload", type=Path, help="JSON lines file of requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the measured requests are replayed")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    parser.add_argument("--chat-latency", type=float, default=defaults.chat_latency, help="Seconds before the first completion token")
+    parser.add_argument("--chat-token-rate", type=float, default=defaults.chat_token_rate, help="Completion tokens per second, 0 for instant")
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens, help="Tokens of every completion")
+    parser.add_argument("--embedding-latency", type=float, default=defaults.embedding_latency, help="Seconds per embeddings request")
+    parser.add_argument("--embedding-token-rate", type=float, default=defaults.embedding_token_rate, help="Embedded tokens per second, 0 for instant")
+    parser.add_argument("--explanation-cache", action="store_true", help="Keep the explanation cache on")
+    parser.add_argument("--verbose", action="store_true", help="Show the logs of the app")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config = BenchmarkConfig(
+        concurrency=args.concurrency,
+        repeat=args.repeat,
+        upstream=UpstreamProfile(
+            chat_latency=args.chat_latency,
+            chat_token_rate=args.chat_token_rate,
+            completion_tokens=args.completion_tokens,
+            embedding_latency=args.embedding_latency,
+            embedding_token_rate=args.embedding_token_rate,
+        ),
+        explanation_cache=args.explanation_cache,
+    )
+    workload = load_workload(args.workload)
+    report = run_benchmark(workload, config, quiet=not args.verbose)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    print(f"{report['requests']} requests in {report['duration_s']}s, {report['throughput_rps']} req/s, {report['errors']} errors", file=sys.stderr)
+    for label, endpoint in report["endpoints"].items():
+        latency = endpoint["latency_ms"]
+        print(f"  {label}: p50 {latency['p50']}ms p95 {latency['p95']}ms p99 {latency['p99']}ms", file=sys.stderr)
+        for stage_name, stage in endpoint["stages_ms"].items():
+            print(f"    {stage_name}: p50 {stage['p50']}ms p95 {stage['p95']}ms p99 {stage['p99']}ms", file=sys.stderr)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+In-process stand-ins for the services the API depends on.
+
+`FakeOpenAI` answers chat completions and embeddings like the OpenAI client does,
+after a simulated latency: a fixed part per request plus the tokens at a given rate.
+`InMemoryDictionary` answers lookups from the fuzzy index instead of Postgres.
+Nothing here touches the network.
+"""
+import asyncio
+import hashlib
+import re
+import time
+import uuid
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from pydantic import BaseModel
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from data.dictionary import read_dictionary
+from data.fuzzy import FuzzyIndex
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count, words and punctuation, good enough to scale simulated latencies."""
+    return len(_TOKEN.findall(text))
+
+
+class UpstreamProfile(BaseModel):
+    """Simulated OpenAI latencies, in seconds and tokens per second (0 for no delay)."""
+    chat_latency: float = 0.3
+    chat_token_rate: float = 50.0
+    completion_tokens: int = 60
+    embedding_latency: float = 0.05
+    embedding_token_rate: float = 0.0
+
+    def token_delay(self) -> float:
+        return 1 / self.chat_token_rate if self.chat_token_rate > 0 else 0.0
+
+    def embedding_delay(self, tokens: int) -> float:
+        rate = tokens / self.embedding_token_rate if self.embedding_token_rate > 0 else 0.0
+        return self.embedding_latency + rate
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    """Unit vector derived from the text, the same text always gets the same vector."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _Requests:
+    """Counts the calls made to a fake endpoint."""
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    def record(self, tokens: int) -> None:
+        self.calls += 1
+        self.tokens += tokens
+
+
+class _Completions:
+    def __init__(self, owner: "FakeOpenAI", asynchronous: bool):
+        self.owner = owner
+        self.asynchronous = asynchronous
+
+    def create(self, *, model: str, messages: list, stream: bool = False, **kwargs):
+        prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+        self.owner.chat.record(prompt_tokens)
+        if not self.asynchronous:
+            time.sleep(self.owner.profile.chat_latency + self.owner.profile.token_delay() * self.owner.profile.completion_tokens)
+            return self.owner.completion(model, prompt_tokens)
+        if stream:
+            return self._astream(model, prompt_tokens)
+        return self._acreate(model, prompt_tokens)
+
+    async def _acreate(self, model: str, prompt_tokens: int) -> ChatCompletion:
+        profile = self.owner.profile
+        await asyncio.sleep(profile.chat_latency + profile.token_delay() * profile.completion_tokens)
+        return self.owner.completion(model, prompt_tokens)
+
+    async def _astream(self, model: str, prompt_tokens: int) -> AsyncIterator[ChatCompletionChunk]:
+        await asyncio.sleep(self.owner.profile.chat_latency)
+        return self._chunks(model, prompt_tokens)
+
+    async def _chunks(self, model: str, prompt_tokens: int) -> AsyncIterator[ChatCompletionChunk]:
+        profile = self.owner.profile
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for word in self.owner.reply_words():
+            await asyncio.sleep(profile.token_delay())
+            yield ChatCompletionChunk.model_validate({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]
+            })
+        yield ChatCompletionChunk.model_validate({
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [], "usage": self.owner.usage(prompt_tokens)
+        })
+
+
+class _Embeddings:
+    def __init__(self, owner: "FakeOpenAI", asynchronous: bool):
+        self.owner = owner
+        self.asynchronous = asynchronous
+
+    def create(self, *, input, model: str, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        tokens = sum(count_tokens(text) for text in texts)
+        self.owner.embeddings.record(tokens)
+        delay = self.owner.profile.embedding_delay(tokens)
+        if not self.asynchronous:
+            time.sleep(delay)
+            return self.owner.embedding_response(texts, model, tokens)
+        return self._acreate(texts, model, tokens, delay)
+
+    async def _acreate(self, texts: List[str], model: str, tokens: int, delay: float) -> CreateEmbeddingResponse:
+        await asyncio.sleep(delay)
+        return self.owner.embedding_response(texts, model, tokens)
+
+
+class _Client:
+    """Sync or async view of a FakeOpenAI, shaped like OpenAI / AsyncOpenAI."""
+
+    def __init__(self, owner: "FakeOpenAI", asynchronous: bool):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = _Completions(owner, asynchronous)
+        self.embeddings = _Embeddings(owner, asynchronous)
+
+
+class FakeOpenAI:
+    """OpenAI stand-in shared by the sync and async clients, so calls are counted in one place."""
+
+    REPLY_WORD = "simpler"
+
+    def __init__(self, profile: Optional[UpstreamProfile] = None, dimension: int = 1536):
+        self.profile = profile or UpstreamProfile()
+        self.dimension = dimension
+        self.chat = _Requests()
+        self.embeddings = _Requests()
+        self.client = _Client(self, asynchronous=False)
+        self.async_client = _Client(self, asynchronous=True)
+
+    def reply_words(self) -> Iterator[str]:
+        for i in range(self.profile.completion_tokens):
+            yield self.REPLY_WORD if i == 0 else f" {self.REPLY_WORD}"
+
+    def usage(self, prompt_tokens: int) -> dict:
+        completion_tokens = self.profile.completion_tokens
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def completion(self, model: str, prompt_tokens: int) -> ChatCompletion:
+        return ChatCompletion.model_validate({
+            "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(self.reply_words())}}],
+            "usage": self.usage(prompt_tokens)
+        })
+
+    def embedding_response(self, texts: List[str], model: str, tokens: int) -> CreateEmbeddingResponse:
+        return CreateEmbeddingResponse.model_validate({
+            "object": "list", "model": model,
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, self.dimension)}
+                     for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    @property
+    def stats(self) -> dict:
+        return {"chat_requests": self.chat.calls, "chat_prompt_tokens": self.chat.tokens,
+                "embedding_requests": self.embeddings.calls, "embedding_tokens": self.embeddings.tokens}
+
+
+class InMemoryDictionary:
+    """Dictionary lookups answered from the fuzzy index, with the interface of SQLClient."""
+
+    def __init__(self, entries: Optional[Iterable[Tuple[str, str]]] = None):
+        self.jargon_index = FuzzyIndex(entries if entries is not None else read_dictionary())
+
+    def load_jargon(self) -> None:
+        pass
+
+    def search_word(self, word: str) -> Tuple[str, str] | None:
+        return self.search_words([word])[0]
+
+    def search_words(self, words: List[str]) -> List[Tuple[str, str] | None]:
+        return [self.jargon_index.lookup(word.lower()) for word in words]
@@ -0,0 +1,285 @@
+"""
+Load test of the API against in-process stand-ins of its upstreams.
+
+The FastAPI app is served in-process and driven over ASGI at a fixed concurrency.
+OpenAI is replaced by `FakeOpenAI`, Qdrant by the local vector store in a temporary
+directory, Postgres by the in-memory dictionary, and entities are detected in dictionary mode,
+which needs no spaCy model. The numbers measure the service itself with upstream
+latencies under control.
+
+A workload is a JSON lines file, one request per line:
+
+    {"method": "POST", "path": "/explain", "body": {...}}
+    {"method": "POST", "path": "/save-document/stream", "params": {"source": "manual"}, "content": "...", "setup": true}
+
+Setup requests run first, one at a time and unmeasured, e.g. to ingest the documents
+the explanations are retrieved from. The others are replayed `repeat` times by
+`concurrency` workers. Per-stage timings come from the request logs the metrics
+middleware writes, matched to the client-side latencies by request ID.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from unittest import mock
+import numpy as np
+from pydantic import BaseModel
+
+APP_DIR = Path(__file__).absolute().parent.parent / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+# Read at import by the vector store, must be set before the app is loaded
+os.environ.setdefault("EMBEDDING_DIMENSION", "1536")
+
+from .fakes import FakeOpenAI, InMemoryDictionary, UpstreamProfile
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+class WorkloadRequest(BaseModel):
+    """One request of a workload."""
+    method: str = "POST"
+    path: str
+    body: Optional[Any] = None
+    params: Optional[Dict[str, str]] = None
+    # Raw request body, sent instead of `body` for endpoints reading the stream
+    content: Optional[str] = None
+    setup: bool = False
+    # Reported under this name, "METHOD path" by default
+    name: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return self.name or f"{self.method.upper()} {self.path}"
+
+
+class BenchmarkConfig(BaseModel):
+    """Settings of a run."""
+    concurrency: int = 8
+    repeat: int = 1
+    upstream: UpstreamProfile = UpstreamProfile()
+    embedding_dimension: int = 1536
+    # Off by default so repeated requests measure the full path instead of cache hits
+    explanation_cache: bool = False
+
+
+class RequestResult(BaseModel):
+    label: str
+    request_id: str
+    status: int
+    latency_ms: float
+
+
+def load_workload(path: Path) -> List[WorkloadRequest]:
+    """Read a workload file, skipping blank lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [WorkloadRequest.model_validate_json(line) for line in f if line.strip()]
+
+
+def load_app():
+    """Import the API module, which connects to nothing until its lifespan runs."""
+    import main
+    return main
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Percentiles, mean and max of a sample, rounded to microseconds when in milliseconds."""
+    if not values:
+        return {}
+    sample = np.asarray(values, dtype=float)
+    summary = {f"p{p}": round(float(np.percentile(sample, p)), 3) for p in PERCENTILES}
+    summary["mean"] = round(float(sample.mean()), 3)
+    summary["max"] = round(float(sample.max()), 3)
+    return summary
+
+
+class _StageLogs(logging.Handler):
+    """Collects the stage breakdowns logged by the metrics middleware, by request ID."""
+
+    def __init__(self):
+        super().__init__()
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            event = json.loads(record.getMessage())
+        except ValueError:
+            return
+        if event.get("event") == "request":
+            self.stages[event["request_id"]] = event["stages_ms"]
+
+
+class Benchmark:
+    """The app wired to the stand-ins, ready to replay workloads."""
+
+    def __init__(self, config: BenchmarkConfig, workdir: Path):
+        self.config = config
+        self.workdir = Path(workdir)
+        self.openai = FakeOpenAI(config.upstream, dimension=config.embedding_dimension)
+        self._patches = ExitStack()
+        self.main = None
+
+    def __enter__(self) -> "Benchmark":
+        main = load_app()
+        from data.dictionary import read_dictionary
+        from ner.NamedEntityExtraction import EntityRecognition
+        from ner.registry import register_entity_recognition
+        from rag import rag as rag_module
+
+        for name, value in {
+            "VECTOR_BACKEND": "local",
+            "VECTOR_STORE_DIR": str(self.workdir / "vectors"),
+            "EMBEDDING_CACHE_DIR": "",
+            **({} if self.config.explanation_cache else {"EXPLANATION_CACHE_SIZE": 0}),
+        }.items():
+            self._patches.enter_context(mock.patch.object(rag_module, name, value))
+
+        # Same assembly as the lifespan, which the ASGI transport does not run
+        dictionary = read_dictionary()
+        ner = EntityRecognition(mode="dictionary")
+        ner.use_jargon(name for name, _ in dictionary)
+        register_entity_recognition(ner)
+        rag = rag_module.Rag(api_key="sk-benchmark", context_path=str(APP_DIR / "rag" / "context.json"),
+                             embedder_dimension=self.config.embedding_dimension)
+        rag.client, rag.async_client = self.openai.client, self.openai.async_client
+        rag.embedder.client, rag.embedder.async_client = self.openai.client, self.openai.async_client
+
+        services = {"sql_client": InMemoryDictionary(dictionary), "ner": ner, "jargon": ner.jargon, "rag": rag}
+        self._patches.enter_context(mock.patch.dict(main.rag, services))
+        main.register_rag(lambda: main.rag.get("rag"))
+        self.main = main
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._patches.close()
+
+    async def run(self, workload: List[WorkloadRequest]) -> Dict[str, Any]:
+        """
+        Replay a workload and report throughput and latencies.
+
+        Args:
+            workload: Requests to send, setup requests first
+
+        Returns:
+            JSON-serializable report, per request label
+        """
+        import httpx
+        from metrics import logger as metrics_logger
+
+        logs = _StageLogs()
+        metrics_logger.addHandler(logs)
+        previous = metrics_logger.level, metrics_logger.propagate
+        metrics_logger.setLevel(logging.INFO)
+        metrics_logger.propagate = False
+
+        transport = httpx.ASGITransport(app=self.main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                setup = [request for request in workload if request.setup]
+                for i, request in enumerate(setup):
+                    result = await self._send(client, request, f"setup-{i}")
+                    if result.status >= 400:
+                        raise RuntimeError(f"Setup request {request.label} failed with status {result.status}")
+
+                measured = [request for request in workload if not request.setup] * self.config.repeat
+                queue: asyncio.Queue = asyncio.Queue()
+                for i, request in enumerate(measured):
+                    queue.put_nowait((i, request))
+                results: List[RequestResult] = []
+
+                async def worker():
+                    while not queue.empty():
+                        i, request = queue.get_nowait()
+                        results.append(await self._send(client, request, f"bench-{i}"))
+
+                start = time.perf_counter()
+                await asyncio.gather(*[worker() for _ in range(max(1, self.config.concurrency))])
+                duration = time.perf_counter() - start
+        finally:
+            metrics_logger.removeHandler(logs)
+            metrics_logger.level, metrics_logger.propagate = previous
+
+        return self._report(results, logs.stages, duration)
+
+    async def _send(self, client, request: WorkloadRequest, request_id: str) -> RequestResult:
+        start = time.perf_counter()
+        response = await client.request(
+            request.method, request.path,
+            json=request.body if request.content is None else None,
+            content=request.content.encode("utf-8") if request.content is not None else None,
+            params=request.params,
+            headers={"X-Request-ID": request_id}
+        )
+        return RequestResult(label=request.label, request_id=request_id, status=response.status_code,
+                             latency_ms=(time.perf_counter() - start) * 1000)
+
+    def _report(self, results: List[RequestResult], stages: Dict[str, Dict[str, float]], duration: float) -> Dict[str, Any]:
+        by_label: Dict[str, List[RequestResult]] = defaultdict(list)
+        for result in results:
+            by_label[result.label].append(result)
+
+        endpoints = {}
+        for label, label_results in by_label.items():
+            stage_samples: Dict[str, List[float]] = defaultdict(list)
+            for result in label_results:
+                for stage_name, ms in stages.get(result.request_id, {}).items():
+                    stage_samples[stage_name].append(ms)
+            status_codes: Dict[str, int] = defaultdict(int)
+            for result in label_results:
+                status_codes[str(result.status)] += 1
+            endpoints[label] = {
+                "requests": len(label_results),
+                "errors": sum(result.status >= 400 for result in label_results),
+                "status_codes": dict(status_codes),
+                "throughput_rps": round(len(label_results) / duration, 3) if duration else None,
+                "latency_ms": summarize([result.latency_ms for result in label_results]),
+                "stages_ms": {name: summarize(samples) for name, samples in sorted(stage_samples.items())},
+            }
+
+        return {
+            "config": self.config.model_dump(),
+            "duration_s": round(duration, 3),
+            "requests": len(results),
+            "errors": sum(result.status >= 400 for result in results),
+            "throughput_rps": round(len(results) / duration, 3) if duration else None,
+            "latency_ms": summarize([result.latency_ms for result in results]),
+            "endpoints": endpoints,
+            "upstream_calls": self.openai.stats,
+            "explanations": self.main.rag["rag"].inflight.stats,
+            "explanation_cache": self.main.rag["rag"].explanation_cache.stats,
+        }
+
+
+def run_benchmark(workload: List[WorkloadRequest], config: BenchmarkConfig, workdir: Optional[Path] = None,
+                  quiet: bool = False) -> Dict[str, Any]:
+    """
+    Replay a workload against the app wired to the stand-ins.
+
+    Args:
+        workload: Requests to send
+        config: Concurrency, repetitions and simulated upstream latencies
+        workdir: Directory for the vector store, a temporary one by default
+        quiet: Only show warnings and errors logged by the app
+
+    Returns:
+        The report, see `Benchmark.run`
+    """
+    with ExitStack() as stack:
+        if workdir is None:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="jargone-benchmark-")))
+        benchmark = stack.enter_context(Benchmark(config, workdir))
+        if quiet:
+            root = logging.getLogger()
+            stack.callback(root.setLevel, root.level)
+            root.setLevel(logging.WARNING)
+        return asyncio.run(benchmark.run(workload))
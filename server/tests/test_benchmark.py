@@ -0,0 +1,62 @@
+import importlib
+import json
+from pathlib import Path
+import pytest
+from benchmarks import BenchmarkConfig, WorkloadRequest, load_workload, run_benchmark
+from benchmarks.fakes import UpstreamProfile
+
+
+class WordEncoding:
+    """Stand-in tokenizer counting one token per whitespace-separated word."""
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(monkeypatch):
+    # The tiktoken encodings cannot be downloaded here
+    for module in ("rag.rag", "rag.embedder", "ingestion.chunker"):
+        monkeypatch.setattr(importlib.import_module(module), "get_encoding", lambda model: WordEncoding())
+
+
+def explain(text):
+    return WorkloadRequest(path="/explain", body={"text": text, "explanationLevel": "basic", "userRole": "sales", "additionalContext": ""})
+
+
+def test_report_covers_endpoints_and_stages(tmp_path):
+    workload = [
+        WorkloadRequest(path="/save-document", body={"content": "Connect to the VPN before using the firewall.", "source": "guide"}, setup=True),
+        explain("Connect to the VPN first."),
+        explain("The firewall blocks the port."),
+        WorkloadRequest(path="/save-document", body={"content": "Every PC has a hard disk.", "source": "storage"}),
+    ]
+    config = BenchmarkConfig(concurrency=4, repeat=3, embedding_dimension=8,
+                             upstream=UpstreamProfile(chat_latency=0, chat_token_rate=0, embedding_latency=0, completion_tokens=5))
+
+    report = run_benchmark(workload, config, workdir=tmp_path)
+
+    json.dumps(report)
+    assert report["requests"] == 9 and report["errors"] == 0
+    explain_report = report["endpoints"]["POST /explain"]
+    assert explain_report["requests"] == 6
+    assert set(explain_report["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
+    assert {"ner", "dictionary", "embedding", "vector_search", "prompt", "completion"} <= set(explain_report["stages_ms"])
+    save_report = report["endpoints"]["POST /save-document"]
+    assert save_report["requests"] == 3
+    assert {"ingest_ner", "ingest_embedding", "ingest_upsert"} <= set(save_report["stages_ms"])
+    # Without the explanation cache every explain request reaches the model, unless an identical one is running
+    assert report["upstream_calls"]["chat_requests"] == report["explanations"]["executions"]
+    assert report["explanations"]["executions"] + report["explanations"]["coalesced"] == 6
+
+
+def test_sample_workload_is_valid():
+    workload = load_workload(Path(__file__).parent.parent / "benchmarks" / "workloads" / "explain.jsonl")
+
+    assert any(request.setup for request in workload)
+    assert {request.path for request in workload} >= {"/explain", "/save-document"}
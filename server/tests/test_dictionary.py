@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import select
+from app.data.dictionary import DICTIONARY_PATH, read_dictionary
+from app.data.relational import Entity
+from app.data.sql_client import SQLClient
+
+
+@pytest.fixture
+def sql_client(tmp_path):
+    client = SQLClient(f"sqlite:///{tmp_path / 'jargone.db'}")
+    client.init()
+    return client
+
+
+def rows(sql_client):
+    with sql_client.engine.connect() as con:
+        return dict(con.execute(select(Entity.name, Entity.detailed_explanation)).all())
+
+
+def test_read_dictionary(tmp_path):
+    path = tmp_path / "dictionary.csv"
+    path.write_text('Entity,Decription\n vpn ,"Virtual private network,\nspanning lines"\nlan,\n,orphan\nvpn,Virtual private network\n')
+
+    assert read_dictionary(path) == [("vpn", "Virtual private network"), ("lan", None)]
+    assert len(read_dictionary(DICTIONARY_PATH)) > 300
+
+
+def test_sync_writes_only_differences(sql_client):
+    first = sql_client.sync_jargon([("vpn", "Virtual private network"), ("lan", "Local network"), ("dsl", "Digital line")])
+    assert (first.inserted, first.updated, first.unchanged, first.deleted) == (3, 0, 0, 0)
+
+    again = sql_client.sync_jargon([("vpn", "Virtual private network"), ("lan", "Local network"), ("dsl", "Digital line")])
+    assert not again.changed and again.unchanged == 3
+
+    edited = sql_client.sync_jargon([("vpn", "Encrypted tunnel"), ("lan", "Local network"), ("wan", "Wide area network")])
+    assert (edited.inserted, edited.updated, edited.unchanged, edited.deleted) == (1, 1, 1, 0)
+    assert rows(sql_client) == {"vpn": "Encrypted tunnel", "lan": "Local network", "dsl": "Digital line", "wan": "Wide area network"}
+
+    pruned = sql_client.sync_jargon([("vpn", "Encrypted tunnel"), ("lan", "Local network")], prune=True)
+    assert pruned.deleted == 2
+    assert set(rows(sql_client)) == {"vpn", "lan"}
+
+
+def test_sync_changes_the_index_fingerprint(sql_client):
+    sql_client.sync_jargon([("vpn", "Virtual private network")])
+    sql_client.reload_jargon_index()
+    version = sql_client._jargon_version
+
+    sql_client.sync_jargon([("vpn", "Encrypted tunnel")])
+
+    assert sql_client._fetch_jargon_version() != version
+    sql_client.reload_jargon_index()
+    assert sql_client.search_word("vpn") == ("vpn", "Encrypted tunnel")
+
+
+def test_load_jargon_applies_csv_edits(sql_client):
+    sql_client.load_jargon()
+    name, definition = read_dictionary()[0]
+    sql_client.sync_jargon([(name, "outdated")])
+
+    sql_client.load_jargon()
+
+    assert rows(sql_client)[name] == definition
+    assert len(sql_client.jargon_index) == len(read_dictionary())
+
+
+def test_reload_callbacks_get_the_new_index(sql_client):
+    seen = []
+    sql_client.on_jargon_reload(lambda index: seen.append(index.names))
+    sql_client.sync_jargon([("vpn", "Virtual private network"), ("lan", "Local network")])
+
+    sql_client.reload_jargon_index()
+
+    assert seen == [["vpn", "lan"]]
+
+
+def test_sync_endpoint_requires_the_admin_token(monkeypatch, sql_client):
+    import main
+    from fastapi.testclient import TestClient
+
+    for name in main.SERVICES:
+        monkeypatch.setitem(main.rag, name, object())
+    monkeypatch.setitem(main.rag, "sql_client", sql_client)
+    client = TestClient(main.app)
+    body = {"entries": [{"name": "vpn", "definition": "Virtual private network"}]}
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    assert client.post("/dictionary/sync", json=body).status_code == 403
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    assert client.post("/dictionary/sync", json=body).status_code == 401
+    assert client.post("/dictionary/sync", json=body, headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    authorized = {"Authorization": "Bearer secret"}
+    assert client.post("/dictionary/sync", json=body, headers=authorized).json()["inserted"] == 1
+    assert client.post("/dictionary/sync", json={"entries": [], "prune": True}, headers=authorized).status_code == 400
+    assert rows(sql_client) == {"vpn": "Virtual private network"}
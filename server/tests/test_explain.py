@@ -0,0 +1,68 @@
+import asyncio
+
+
+def test_stream_cancels_retrieval_when_client_is_gone():
+    import main
+
+    async def run():
+        search_task = asyncio.create_task(asyncio.sleep(10))
+
+        async def events():
+            yield "event: done\n\n"
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("connection reset")
+
+        response = main.TaskStreamingResponse(events(), search_task, media_type="text/event-stream")
+        try:
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        except Exception:
+            pass
+        await asyncio.sleep(0)
+        return search_task.cancelled()
+
+    assert asyncio.run(run())
+
+
+def batch(n):
+    return {"items": [{"text": "Reset the AP", "explanationLevel": "basic", "userRole": "sales", "additionalContext": ""}] * n}
+
+
+def test_batch_is_limited(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    for name in main.SERVICES:
+        monkeypatch.setitem(main.rag, name, object())
+    response = TestClient(main.app).post("/explain/batch", json=batch(main.EXPLAIN_BATCH_MAX_ITEMS + 1))
+    assert response.status_code == 422
+
+
+def test_failed_retrieval_is_reported_per_item(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    class NER:
+        def extract_named_entities_batch(self, texts):
+            return [[] for _ in texts]
+
+    class SQLClient:
+        def search_words(self, words):
+            return [None for _ in words]
+
+    class Rag:
+        async def asearch_context_batch(self, texts, entities=None):
+            await entities
+            raise ConnectionError("vector database is down")
+
+    for name in main.SERVICES:
+        monkeypatch.setitem(main.rag, name, object())
+    monkeypatch.setitem(main.rag, "ner", NER())
+    monkeypatch.setitem(main.rag, "sql_client", SQLClient())
+    monkeypatch.setitem(main.rag, "rag", Rag())
+    response = TestClient(main.app).post("/explain/batch", json=batch(2))
+    assert response.status_code == 200
+    assert response.json()["results"] == [{"explanation": None, "definitions": [], "error": "vector database is down"}] * 2
@@ -0,0 +1,46 @@
+import pytest
+from app.data.fuzzy import FuzzyIndex, levenshtein
+
+ENTRIES = [
+    ("access point", "A device that connects wireless devices to a wired network."),
+    ("accessibility", "Designing technology usable by all people."),
+    ("address", "A location identifier."),
+    ("adress", "A misspelled duplicate."),
+    ("api", "Application programming interface."),
+]
+
+
+def brute_force(word: str, max_distance: int = 2):
+    matches = [(levenshtein(word, name), i, name, definition) for i, (name, definition) in enumerate(ENTRIES)]
+    return [(name, definition, d) for d, _, name, definition in sorted(matches) if d < max_distance]
+
+
+@pytest.fixture(scope="module")
+def index() -> FuzzyIndex:
+    return FuzzyIndex(ENTRIES)
+
+
+@pytest.mark.parametrize("a,b,expected", [
+    ("", "", 0),
+    ("abc", "", 3),
+    ("kitten", "sitting", 3),
+    ("addres", "address", 1),
+    ("flaw", "lawn", 2),
+])
+def test_levenshtein(a, b, expected):
+    assert levenshtein(a, b) == expected
+
+
+def test_levenshtein_cutoff():
+    assert levenshtein("kitten", "sitting", max_distance=1) == 2
+
+
+@pytest.mark.parametrize("word", ["addres", "address", "adres", "acess point", "apis", "ap", "xyz", "accessibilty", ""])
+def test_search_matches_brute_force(index: FuzzyIndex, word: str):
+    assert index.search(word) == brute_force(word)
+
+
+def test_lookup_returns_closest(index: FuzzyIndex):
+    assert index.lookup("address") == ENTRIES[2]
+    assert index.lookup("acess point") == ENTRIES[0]
+    assert index.lookup("unknown") is None
@@ -0,0 +1,63 @@
+import spacy
+import pytest
+from app.ner import NamedEntityExtraction
+from app.ner.NamedEntityExtraction import EntityRecognition
+from app.ner.jargon import JargonMatcher, normalize, term_aliases
+
+TERMS = ["access", "access point", "vpn", "learning management system (lms)", "gigabyte (gig or gb)",
+         "wireless (networking)", "tcp/ip", "hard disk"]
+
+
+def test_aliases_come_from_the_term_name():
+    assert term_aliases("gigabyte (gig or gb)") == ["gigabyte (gig or gb)", "gigabyte", "gig", "gb"]
+    assert term_aliases("cd-rw, cd-r disk") == ["cd-rw, cd-r disk", "cd-rw", "cd-r disk"]
+    assert term_aliases("streaming (streaming media)") == ["streaming (streaming media)", "streaming", "streaming media"]
+    assert term_aliases("wireless (networking)") == ["wireless (networking)", "wireless"]
+    assert [normalize(word) for word in ["Disks", "Addresses", "Proxies", "access", "status"]] == ["disk", "address", "proxy", "access", "status"]
+
+
+def test_longest_terms_are_found_with_token_offsets():
+    matcher = JargonMatcher(TERMS)
+    doc = matcher.nlp.make_doc("Reset the Access\nPoints, the VPN and TCP/IP on 2 GB hard disks, then open the LMS over networking.")
+
+    found = matcher.find(doc)
+
+    assert [(name, doc[start:stop].text) for name, start, stop in found] == [
+        ("access point", "Access\nPoints"),
+        ("vpn", "VPN"),
+        ("tcp/ip", "TCP/IP"),
+        ("gigabyte (gig or gb)", "GB"),
+        ("hard disk", "hard disks"),
+        ("learning management system (lms)", "LMS"),
+    ]
+
+
+def test_dictionary_mode_runs_without_a_model(monkeypatch):
+    def no_model(name):
+        raise AssertionError("the model should not be loaded")
+
+    monkeypatch.setattr(NamedEntityExtraction, "load_spacy", no_model)
+    ner = EntityRecognition("en_core_web_md", mode="dictionary")
+    assert ner.extract_named_entities("Connect to the VPN") == []
+
+    ner.use_jargon(TERMS)
+    entities = ner.extract_named_entities("Connect to the VPN through the access point")
+
+    assert [(ent.text, ent.type, ent.start, ent.stop) for ent in entities] == [("vpn", "jargon", 3, 4), ("access point", "jargon", 6, 8)]
+    assert ner.extract_named_entities_batch(["Connect to the VPN through the access point", "Nothing here"]) == [entities, []]
+
+
+def test_both_mode_keeps_entities_outside_dictionary_terms(monkeypatch):
+    def load_spacy(name):
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler", name="ner")
+        ruler.add_patterns([{"label": "ORG", "pattern": "Netgear"}, {"label": "PRODUCT", "pattern": "VPN"}])
+        return nlp
+
+    monkeypatch.setattr(NamedEntityExtraction, "load_spacy", load_spacy)
+    ner = EntityRecognition("fake_model", mode="both")
+    ner.use_jargon(TERMS)
+
+    entities = ner.extract_named_entities("The Netgear VPN")
+
+    assert [(ent.type, ent.start, ent.stop) for ent in entities] == [("org", 1, 2), ("jargon", 2, 3)]
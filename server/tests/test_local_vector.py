@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from qdrant_client.http import models
+from app.data.local_vector import LocalVectorDB
+from app.data.vector import DocumentChunk
+
+
+def chunk(text, embedding, source_name="docs", **kwargs) -> DocumentChunk:
+    return DocumentChunk(text=text, source_name=source_name, embedding=embedding, **kwargs)
+
+
+@pytest.fixture
+def vector_db(tmp_path) -> LocalVectorDB:
+    return LocalVectorDB(str(tmp_path), embedding_dim=4, segment_size=2)
+
+
+def test_search_ranks_by_cosine_similarity(vector_db):
+    vector_db.add_documents([
+        chunk("Python is a programming language", [1.0, 0.0, 0.0, 0.0]),
+        chunk("TensorFlow is a machine learning framework", [0.6, 0.8, 0.0, 0.0]),
+        chunk("Ethernet switches", [0.0, 0.0, 1.0, 0.0]),
+    ])
+
+    results = vector_db.search([2.0, 0.0, 0.0, 0.0], limit=2)
+
+    assert [result["text"] for result in results] == ["Python is a programming language", "TensorFlow is a machine learning framework"]
+    assert [result["score"] for result in results] == pytest.approx([1.0, 0.6])
+    assert results[0]["source_name"] == "docs"
+
+
+def test_search_batch_and_projection(vector_db):
+    vector_db.add_documents([
+        chunk("Wi-Fi", [1.0, 0.0, 0.0, 0.0]),
+        chunk("Ethernet", [0.0, 1.0, 0.0, 0.0]),
+        chunk("Bluetooth", [0.0, 0.0, 1.0, 0.0]),
+    ])
+
+    results = vector_db.search_batch([[0.0, 0.0, 1.0, 0.0], [0.0, 1.0, 0.0, 0.0]], limit=1, payload_fields=["text"], with_vectors=True)
+
+    assert [[set(record) for record in records] for records in results] == [[{"id", "text", "score", "embedding"}]] * 2
+    assert [records[0]["text"] for records in results] == ["Bluetooth", "Ethernet"]
+    assert results[0][0]["embedding"] == pytest.approx([0.0, 0.0, 1.0, 0.0])
+
+
+def test_search_with_filter(vector_db):
+    vector_db.add_documents([
+        chunk("Python", [0.1] * 4, named_entities=["Python"], metadata={"category": "programming"}),
+        chunk("TensorFlow", [0.1] * 4, named_entities=["TensorFlow"], metadata={"category": "machine_learning"}),
+    ])
+
+    by_metadata = models.Filter(must=[models.FieldCondition(key="metadata.category", match=models.MatchValue(value="programming"))])
+    by_entity = models.Filter(should=[models.FieldCondition(key="named_entities", match=models.MatchAny(any=["TensorFlow", "Keras"]))])
+
+    assert [result["text"] for result in vector_db.search([0.1] * 4, filter_condition=by_metadata)] == ["Python"]
+    assert [result["text"] for result in vector_db.search([0.1] * 4, filter_condition=by_entity)] == ["TensorFlow"]
+
+
+def test_upsert_and_delete_survive_reopening(vector_db, tmp_path):
+    ids = vector_db.add_documents([
+        chunk("first", [1.0, 0.0, 0.0, 0.0], id="a"),
+        chunk("second", [0.0, 1.0, 0.0, 0.0], id="b"),
+        chunk("third", [0.0, 0.0, 1.0, 0.0], id="c", source_name="other"),
+    ])
+    vector_db.add_documents([chunk("second, edited", [0.0, 1.0, 0.0, 0.0], id="b")])
+    vector_db.delete_points(["a"])
+    vector_db.add_documents([chunk("first, again", [1.0, 0.0, 0.0, 0.0], id="a")])
+    vector_db.delete_points(["c"])
+
+    reopened = LocalVectorDB(str(tmp_path), embedding_dim=4, segment_size=2)
+
+    assert ids == ["a", "b", "c"]
+    assert len(list(tmp_path.glob("segment-*.f32"))) == 3
+    for db in (vector_db, reopened):
+        assert len(db) == 2
+        assert db.get_point_ids("docs") == {"a", "b"}
+        assert db.get_point_ids("other") == set()
+        assert [result["text"] for result in db.search([1.0, 0.5, 0.0, 0.0], limit=5)] == ["first, again", "second, edited"]
+
+
+def test_partially_written_row_is_dropped(vector_db, tmp_path):
+    vector_db.add_documents([chunk("kept", [1.0, 0.0, 0.0, 0.0], id="a")])
+    with (tmp_path / "segment-00000.f32").open("ab") as f:
+        f.write(b"\0" * 7)
+
+    reopened = LocalVectorDB(str(tmp_path), embedding_dim=4, segment_size=2)
+    reopened.add_documents([chunk("appended", [0.0, 1.0, 0.0, 0.0], id="b")])
+
+    assert [result["text"] for result in reopened.search([0.0, 1.0, 0.0, 0.0], limit=1)] == ["appended"]
+
+
+def test_rejects_wrong_dimension(vector_db):
+    with pytest.raises(ValueError):
+        vector_db.add_documents([chunk("wrong", [1.0, 0.0])])
+
+
+def test_filter_indexes_follow_appends(tmp_path):
+    vector_db = LocalVectorDB(str(tmp_path), embedding_dim=4)
+    vector_db.add_documents([
+        chunk("Python", [1.0, 0.0, 0.0, 0.0], id="a", named_entities=["Python"]),
+        chunk("Keras", [0.9, 0.1, 0.0, 0.0], id="b", named_entities=["Keras"]),
+    ])
+    by_entity = models.Filter(should=[models.FieldCondition(key="named_entities", match=models.MatchAny(any=["Keras"]))])
+    assert [result["id"] for result in vector_db.search([1.0, 0.0, 0.0, 0.0], filter_condition=by_entity)] == ["b"]
+
+    vector_db.add_documents([chunk("Keras layers", [1.0, 0.05, 0.0, 0.0], id="c", named_entities=["Keras"])])
+    not_b = models.Filter(must_not=[models.HasIdCondition(has_id=["b"])])
+
+    assert [result["id"] for result in vector_db.search([1.0, 0.0, 0.0, 0.0], filter_condition=by_entity)] == ["c", "b"]
+    assert [result["id"] for result in asyncio.run(vector_db.asearch([1.0, 0.0, 0.0, 0.0], filter_condition=not_b))] == ["a", "c"]
+
+
+def test_set_payloads_keeps_vectors(vector_db, tmp_path):
+    vector_db.add_documents([chunk("first", [1.0, 0.0, 0.0, 0.0], id="a", chunk_id=3), chunk("second", [0.0, 1.0, 0.0, 0.0], id="b", chunk_id=4)])
+
+    vector_db.set_payloads({"a": {"chunk_id": 0}, "b": {"chunk_id": 4}, "missing": {"chunk_id": 1}})
+
+    reopened = LocalVectorDB(str(tmp_path), embedding_dim=4, segment_size=2)
+    for db in (vector_db, reopened):
+        results = db.search([1.0, 0.0, 0.0, 0.0], limit=2, with_vectors=True)
+        assert [(result["id"], result["chunk_id"], result["text"]) for result in results] == [("a", 0, "first"), ("b", 4, "second")]
+        assert results[0]["embedding"] == pytest.approx([1.0, 0.0, 0.0, 0.0])
+    # The unchanged chunk was not appended again
+    assert sum(len(segment) for segment in reopened._segments) == 3
@@ -0,0 +1,102 @@
+import json
+import logging
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import generate_latest
+from app import metrics
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(metrics.RequestMetricsMiddleware)
+
+    def blocking_step():
+        with metrics.stage("ner"):
+            return "entities"
+
+    @app.get("/explain")
+    async def explain():
+        await run_in_threadpool(blocking_step)
+        with metrics.stage("completion"):
+            return {"request_id": metrics.current_request_id()}
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"item_id": item_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            with metrics.stage("completion"):
+                yield "token"
+        return StreamingResponse(body())
+
+    return app
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(json.loads(record.getMessage()))
+
+
+def test_request_id_and_stage_breakdown_are_logged():
+    client = TestClient(make_app())
+    handler = RecordingHandler()
+    metrics.logger.addHandler(handler)
+    metrics.logger.setLevel(logging.INFO)
+    try:
+        response = client.get("/explain", headers={"X-Request-ID": "abc123"})
+        streamed = client.get("/stream")
+    finally:
+        metrics.logger.removeHandler(handler)
+
+    assert response.headers["x-request-id"] == "abc123"
+    assert response.json() == {"request_id": "abc123"}
+    explain_log, stream_log = handler.messages
+    assert explain_log["request_id"] == "abc123"
+    assert explain_log["status"] == 200
+    assert set(explain_log["stages_ms"]) == {"ner", "completion"}
+    # Stages running while the body is streamed belong to the request too
+    assert stream_log["request_id"] == streamed.headers["x-request-id"]
+    assert set(stream_log["stages_ms"]) == {"completion"}
+
+
+def test_metrics_are_exported():
+    client = TestClient(make_app())
+    client.get("/explain")
+    metrics.record_usage(SimpleNamespace(prompt_tokens=120, completion_tokens=30,
+                                         prompt_tokens_details=SimpleNamespace(cached_tokens=100)))
+    rag = SimpleNamespace(
+        explanation_cache=SimpleNamespace(stats={"hits": 3, "misses": 1}),
+        embedding_cache=SimpleNamespace(stats={"memory_hits": 5, "disk_hits": 2, "misses": 4}),
+        inflight=SimpleNamespace(stats={"executions": 1, "coalesced": 6, "in_flight": 0})
+    )
+    metrics.register_rag(lambda: rag)
+
+    exported = generate_latest(metrics.REGISTRY).decode()
+
+    assert 'jargone_stage_seconds_count{stage="ner"}' in exported
+    assert 'jargone_request_seconds_count{endpoint="/explain",status="200"}' in exported
+    assert 'jargone_requests_in_flight{endpoint="/explain"} 0.0' in exported
+    assert 'jargone_llm_tokens_total{kind="cached_prompt"}' in exported
+    assert 'jargone_cache_requests_total{cache="explanation",result="hit"} 3.0' in exported
+    assert 'jargone_explanations_total{source="coalesced"} 6.0' in exported
+
+
+def test_endpoint_labels_are_route_templates():
+    client = TestClient(make_app())
+    for path in ("/items/1", "/items/2", "/scan/a", "/scan/b"):
+        client.get(path)
+
+    exported = generate_latest(metrics.REGISTRY).decode()
+
+    assert 'jargone_request_seconds_count{endpoint="/items/{item_id}",status="200"} 2.0' in exported
+    assert 'jargone_requests_in_flight{endpoint="unmatched"} 0.0' in exported
+    assert "/scan/" not in exported and "/items/1" not in exported
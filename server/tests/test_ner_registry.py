@@ -0,0 +1,18 @@
+import spacy
+from app.ner import registry, NamedEntityExtraction
+
+
+def test_registry_loads_model_once(monkeypatch):
+    loads = []
+    def fake_load_spacy(name):
+        loads.append(name)
+        return spacy.blank("en")
+
+    monkeypatch.setattr(NamedEntityExtraction, "load_spacy", fake_load_spacy)
+    monkeypatch.setattr(registry, "_models", {})
+
+    first = registry.get_entity_recognition("fake_model")
+    second = registry.get_entity_recognition("fake_model")
+
+    assert first is second
+    assert loads == ["fake_model"]
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import pytest
+from app.ingestion.chunker import TokenChunker
+from app.ingestion.pipeline import IngestionPipeline
+
+
+class WordEncoding:
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class FakeNER:
+    def extract_named_entities_batch(self, texts):
+        return [[] for _ in texts]
+
+
+class FakeEmbedder:
+    def __init__(self, fail_after=None):
+        self.calls = 0
+        self.fail_after = fail_after
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("embedding failed")
+        return [[float(len(text))] for text in texts]
+
+
+class FakeVectorDB:
+    def __init__(self):
+        self.batches = []
+        self.points = {}
+
+    def get_point_ids(self, source_name):
+        return {point_id for point_id, doc in self.points.items() if doc.source_name == source_name}
+
+    def delete_points(self, ids):
+        for point_id in ids:
+            del self.points[point_id]
+
+    def set_payloads(self, payloads):
+        for point_id, fields in payloads.items():
+            self.points[point_id] = self.points[point_id].model_copy(update=fields)
+
+    def add_documents(self, documents):
+        self.batches.append(list(documents))
+        self.points.update((doc.id, doc) for doc in documents)
+        return [doc.id for doc in documents]
+
+
+def sentences(n):
+    for i in range(n):
+        yield f"Sentence {i} is here. "
+
+
+@pytest.fixture
+def chunker() -> TokenChunker:
+    # Every sentence becomes its own chunk
+    return TokenChunker(max_tokens=4, overlap_tokens=0, encoding=WordEncoding())
+
+
+def test_pipeline_upserts_fixed_size_batches(chunker):
+    vector_db = FakeVectorDB()
+    pipeline = IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER(), batch_size=3, upsert_batch_size=5, queue_size=1)
+    reported = []
+
+    progress = pipeline.run(sentences(12), "manual", metadata={"lang": "en"}, on_progress=reported.append)
+
+    assert [len(batch) for batch in vector_db.batches] == [5, 5, 2]
+    chunks = [chunk for batch in vector_db.batches for chunk in batch]
+    assert [chunk.chunk_id for chunk in chunks] == list(range(12))
+    assert all(chunk.embedding is not None and chunk.source_name == "manual" for chunk in chunks)
+    assert chunks[0].metadata == {"lang": "en"}
+    assert progress.done and progress.chunks == progress.upserted == 12
+    assert [p.upserted for p in reported] == [5, 10, 12, 12]
+
+
+def test_pipeline_propagates_stage_errors(chunker):
+    vector_db = FakeVectorDB()
+    pipeline = IngestionPipeline(FakeEmbedder(fail_after=1), vector_db, chunker, ner=FakeNER(), batch_size=2, upsert_batch_size=2, queue_size=1)
+
+    with pytest.raises(RuntimeError, match="embedding failed"):
+        pipeline.run(sentences(1000), "manual")
+
+    assert sum(len(batch) for batch in vector_db.batches) <= 2
+
+
+def test_reingestion_only_embeds_changed_chunks(chunker):
+    vector_db = FakeVectorDB()
+    embedder = FakeEmbedder()
+    IngestionPipeline(embedder, vector_db, chunker, ner=FakeNER()).run(sentences(10), "manual")
+    IngestionPipeline(embedder, vector_db, chunker, ner=FakeNER()).run(sentences(3), "other")
+    first_ids = vector_db.get_point_ids("manual")
+    vector_db.batches.clear()
+
+    edited = list(sentences(10))
+    edited[4] = "Sentence four was edited. "
+    del edited[7]
+    progress = IngestionPipeline(embedder, vector_db, chunker, ner=FakeNER()).run(edited, "manual")
+
+    assert [chunk.text for batch in vector_db.batches for chunk in batch] == ["Sentence four was edited."]
+    # Chunks after the removed sentence moved up
+    assert sorted(doc.chunk_id for doc in vector_db.points.values() if doc.source_name == "manual") == list(range(9))
+    assert (progress.chunks, progress.skipped, progress.upserted, progress.deleted) == (9, 8, 1, 2)
+    assert len(vector_db.get_point_ids("manual")) == 9
+    assert len(first_ids & vector_db.get_point_ids("manual")) == 8
+    assert len(vector_db.get_point_ids("other")) == 3
+
+
+def test_failed_run_keeps_existing_points(chunker):
+    vector_db = FakeVectorDB()
+    IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER()).run(sentences(5), "manual")
+
+    pipeline = IngestionPipeline(FakeEmbedder(fail_after=0), vector_db, chunker, ner=FakeNER())
+    with pytest.raises(RuntimeError):
+        pipeline.run(["Something else entirely. "], "manual")
+
+    assert len(vector_db.get_point_ids("manual")) == 5
+
+
+def test_editing_a_paragraph_keeps_most_point_ids():
+    chunker = TokenChunker(max_tokens=60, overlap_tokens=10, encoding=WordEncoding())
+    paragraphs = [
+        " ".join(f"Paragraph {p} sentence {s} explains term{(p * 5 + s) % 13} in detail." for s in range(5))
+        for p in range(40)
+    ]
+    vector_db = FakeVectorDB()
+    IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER()).run(["\n\n".join(paragraphs)], "manual")
+    first_ids = vector_db.get_point_ids("manual")
+
+    paragraphs[3] += " One more sentence was added to this paragraph."
+    progress = IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER()).run(["\n\n".join(paragraphs)], "manual")
+
+    assert len(first_ids) >= 30
+    assert progress.upserted <= 3
+    assert len(first_ids & vector_db.get_point_ids("manual")) >= len(first_ids) - 3
+
+
+def test_interrupted_upload_keeps_existing_points(chunker, monkeypatch):
+    import main
+    from starlette.requests import ClientDisconnect
+
+    vector_db = FakeVectorDB()
+    IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER()).run(sentences(10), "manual")
+
+    finished = threading.Event()
+
+    class Rag:
+        def ingest(self, pieces, source, metadata=None):
+            try:
+                return IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER()).run(pieces, source, metadata)
+            finally:
+                finished.set()
+
+    class Request:
+        async def stream(self):
+            yield "Sentence 0 is here. Sentence 1 is here. ".encode()
+            raise ClientDisconnect()
+
+    monkeypatch.setitem(main.rag, "rag", Rag())
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(main.save_document_stream(Request(), "manual"))
+
+    assert finished.wait(5)
+
+    assert len(vector_db.get_point_ids("manual")) == 10
+
+
+def test_changed_metadata_replaces_the_points(chunker):
+    vector_db = FakeVectorDB()
+    IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER()).run(sentences(4), "manual", metadata={"lang": "de"})
+    first_ids = vector_db.get_point_ids("manual")
+
+    progress = IngestionPipeline(FakeEmbedder(), vector_db, chunker, ner=FakeNER()).run(sentences(4), "manual", metadata={"lang": "en"})
+
+    assert (progress.upserted, progress.skipped, progress.deleted) == (4, 0, 4)
+    assert not first_ids & vector_db.get_point_ids("manual")
+    assert {doc.metadata["lang"] for doc in vector_db.points.values()} == {"en"}
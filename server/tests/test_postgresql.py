@@ -1,12 +1,43 @@
+from app.data import sql_client as sql_client_module
 from app.data.sql_client import SQLClient
+from sqlalchemy import text
 import pytest
+import uuid
 
 @pytest.fixture(scope='module')
 def sql_client() -> SQLClient:
     return SQLClient()
 
+@pytest.fixture
+def scratch_client(monkeypatch):
+    """Client of a throwaway schema, tests writing terms leave the database and its listeners alone."""
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = SQLClient()
+    with admin.engine.begin() as con:
+        con.execute(text(f'CREATE SCHEMA "{schema}"'))
+    url = admin.engine.url.update_query_dict({"options": f"-csearch_path={schema},public"})
+    monkeypatch.setattr(sql_client_module, "JARGON_CHANNEL", f"{schema}_changed")
+    client = SQLClient(url.render_as_string(hide_password=False))
+    try:
+        yield client
+    finally:
+        client.engine.dispose()
+        with admin.engine.begin() as con:
+            con.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+        admin.engine.dispose()
+
 
 def test_searc(sql_client: SQLClient):
     text1 = 'addres'
     
-    sql_client.search_word(text1)
\ No newline at end of file
+    sql_client.search_word(text1)
+
+def test_search_words_finds_short_misspelled_terms(scratch_client: SQLClient):
+    scratch_client.init()
+    scratch_client.sync_jargon([("cat", "Category 5 cable"), ("lan", "Local area network"), ("100%_load", "Fully loaded")])
+
+    # "cat" and "cut" share almost no trigrams, the lookup must not depend on their similarity
+    assert scratch_client.search_words(["cut", "la", "lans", "100%_loads", "100xxload"]) == [
+        ("cat", "Category 5 cable"), ("lan", "Local area network"), ("lan", "Local area network"),
+        ("100%_load", "Fully loaded"), None
+    ]
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from app.startup import Startup
+
+
+def test_steps_run_concurrently():
+    ready = {}
+
+    def slow(result):
+        def step():
+            time.sleep(0.2)
+            return result
+        return step
+
+    startup = Startup({"ner": slow("pipeline"), "rag": slow("rag")}, on_ready=ready.__setitem__)
+    start = time.perf_counter()
+
+    assert asyncio.run(startup.run())
+    assert time.perf_counter() - start < 0.35
+    assert ready == {"ner": "pipeline", "rag": "rag"}
+    assert startup.state["ner"]["status"] == "ready"
+
+
+def test_failing_steps_are_retried_then_given_up():
+    calls = {"flaky": 0, "broken": 0}
+
+    def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 2:
+            raise ConnectionError("database is starting")
+        return "client"
+
+    def broken():
+        calls["broken"] += 1
+        raise ConnectionError("no route to host")
+
+    ready = {}
+    startup = Startup({"sql_client": flaky, "vector": broken}, on_ready=ready.__setitem__, attempts=3, retry_seconds=0)
+
+    assert not asyncio.run(startup.run())
+    assert ready == {"sql_client": "client"}
+    assert startup.state["sql_client"]["attempts"] == 2
+    assert startup.state["vector"] == {"status": "failed", "attempts": 3, "seconds": None, "error": "ConnectionError: no route to host"}
+    assert startup.failed
+
+
+def test_endpoints_wait_for_readiness(monkeypatch):
+    import main
+
+    client = TestClient(main.app)
+    assert client.get("/healthz").json() == {"status": "ok"}
+    assert client.get("/readyz").status_code == 503
+    response = client.post("/explain", json={"text": "Reset the AP", "explanationLevel": "basic", "userRole": "sales", "additionalContext": ""})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    for name in main.SERVICES:
+        monkeypatch.setitem(main.rag, name, object())
+    assert client.get("/readyz").json()["status"] == "ready"
+
+
+def test_dependent_steps_wait_for_their_dependencies():
+    order = []
+
+    def step(name, fail=False):
+        def run():
+            time.sleep(0.05)
+            if fail:
+                raise ConnectionError("unreachable")
+            order.append(name)
+            return name
+        return run
+
+    startup = Startup(
+        {"jargon": step("jargon"), "sql_client": step("sql_client"), "ner": step("ner"), "index": step("index"), "vector": step("vector", fail=True)},
+        on_ready=lambda name, result: None,
+        depends_on={"jargon": ["sql_client", "ner"], "index": ["vector"]},
+        attempts=1
+    )
+
+    assert not asyncio.run(startup.run())
+    assert order[-1] == "jargon"
+    assert startup.state["index"] == {"status": "failed", "attempts": 0, "seconds": None, "error": "vector failed"}
+
+
+def test_retried_jargon_step_registers_one_reload_callback(monkeypatch, tmp_path):
+    import main
+    from app.data.sql_client import SQLClient
+    from app.ner.NamedEntityExtraction import EntityRecognition
+
+    sql_client = SQLClient(f"sqlite:///{tmp_path / 'jargone.db'}")
+    sql_client.init()
+    sql_client.sync_jargon([("access point", "Wireless base station")])
+    ner = EntityRecognition(mode="dictionary")
+    monkeypatch.setitem(main.rag, "sql_client", sql_client)
+    monkeypatch.setitem(main.rag, "ner", ner)
+    compiled = []
+    monkeypatch.setattr(ner, "use_jargon", compiled.append)
+
+    sql_client.reload_jargon_index()
+    for _ in range(3):
+        main.init_jargon()
+    compiled.clear()
+    sql_client.reload_jargon_index()
+
+    assert compiled == [["access point"]]
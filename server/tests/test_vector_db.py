@@ -216,4 +216,77 @@ class TestQdrantVectorDB:
         
         # Should only get doc2
         assert len(results) == 1
-        assert "TensorFlow" in results[0]["text"] 
\ No newline at end of file
+        assert "TensorFlow" in results[0]["text"] 
+
+def test_clients_are_shared_per_connection_settings():
+    """Clients are created once per connection settings and reused"""
+    from app.data.vector import get_qdrant_client
+
+    client = get_qdrant_client(host="localhost", port=6333)
+    assert get_qdrant_client(host="localhost", port=6333) is client
+    assert get_qdrant_client(host="localhost", port=6333, asynchronous=True) is not client
+    assert get_qdrant_client(host="localhost", port=6333, timeout=1) is not client
+
+
+class TestPayloadProjection:
+    """Tests for payload selection and batch search using an in-memory Qdrant"""
+
+    @pytest.fixture
+    def vector_db(self, monkeypatch):
+        from qdrant_client import QdrantClient
+        client = QdrantClient(":memory:")
+        monkeypatch.setattr("app.data.vector.get_qdrant_client", lambda **kwargs: client)
+        db = QdrantVectorDB(collection_name=COLLECTION_NAME, embedding_dim=4)
+        db.add_documents([
+            DocumentChunk(text="Wi-Fi access points", source_name="manual", chunk_id=0, named_entities=["Wi-Fi"],
+                          embedding=[1.0, 0.0, 0.0, 0.0]),
+            DocumentChunk(text="Ethernet switches", source_name="manual", chunk_id=1, named_entities=["Ethernet"],
+                          embedding=[0.0, 1.0, 0.0, 0.0]),
+        ])
+        return db
+
+    def test_search_returns_selected_fields(self, vector_db):
+        results = vector_db.search([1.0, 0.1, 0.0, 0.0], limit=1, payload_fields=["text"])
+
+        assert results == [{"id": results[0]["id"], "text": "Wi-Fi access points", "score": results[0]["score"]}]
+
+    def test_search_returns_full_payload_and_vectors(self, vector_db):
+        result = vector_db.search([1.0, 0.1, 0.0, 0.0], limit=1, with_vectors=True)[0]
+
+        assert result["named_entities"] == ["Wi-Fi"]
+        assert result["source_name"] == "manual"
+        assert result["embedding"] == pytest.approx([1.0, 0.0, 0.0, 0.0])
+
+    def test_search_batch_keeps_query_order(self, vector_db):
+        results = vector_db.search_batch([[0.0, 1.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]], limit=1, payload_fields=["text"])
+
+        assert [[record["text"] for record in records] for records in results] == [["Ethernet switches"], ["Wi-Fi access points"]]
+        assert vector_db.search_batch([]) == []
+
+
+def test_collection_config_translates_to_qdrant_settings():
+    """Quantization choice drives both the collection and the search parameters"""
+    from app.data.vector import CollectionConfig
+
+    scalar = CollectionConfig(quantization="scalar", hnsw_ef=64)
+    assert isinstance(scalar.quantization_config(), models.ScalarQuantization)
+    assert scalar.search_params().hnsw_ef == 64
+    assert scalar.search_params().quantization.rescore
+
+    binary = CollectionConfig(quantization="binary", quantization_oversampling=3.0)
+    assert isinstance(binary.quantization_config(), models.BinaryQuantization)
+    assert binary.search_params().quantization.oversampling == 3.0
+
+    plain = CollectionConfig(quantization="none")
+    assert plain.quantization_config() is None
+    assert plain.search_params().quantization is None
+
+
+def test_collection_config_defaults_to_memory_storage():
+    """On-disk storage and quantization are opt-in"""
+    from app.data.vector import CollectionConfig
+
+    config = CollectionConfig()
+
+    assert not config.on_disk_vectors and not config.on_disk_payload
+    assert config.quantization_config() is None
@@ -0,0 +1,59 @@
+import pytest
+from app.rag import cache as cache_module
+from app.rag.cache import ExplanationCache, LocalCacheBackend
+
+NERS = [("access point", "A wireless device."), ("api", "Application programming interface.")]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_local_backend_ttl(clock):
+    backend = LocalCacheBackend()
+    backend.set("key", "value", ttl=10)
+    assert backend.get("key") == "value"
+
+    clock[0] += 11
+    assert backend.get("key") is None
+    assert len(backend) == 0
+
+
+def test_local_backend_lru_eviction():
+    backend = LocalCacheBackend(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+
+
+def test_local_backend_incr():
+    backend = LocalCacheBackend()
+    assert backend.incr("counter") == 1
+    assert backend.incr("counter") == 2
+    assert backend.get("counter") == 2
+
+
+def test_key_normalizes_sentence_and_entity_order():
+    cache = ExplanationCache(LocalCacheBackend())
+    assert cache.key("The  access point\n", "basic", "Engineer", NERS) == cache.key("The access point", "basic", "engineer", NERS[::-1])
+    assert cache.key("The access point", "basic", "engineer", NERS) != cache.key("The access point", "detailed", "engineer", NERS)
+    assert cache.key("The access point", "basic", "engineer", NERS) != cache.key("The access point", "basic", "engineer", NERS[:1])
+
+
+def test_invalidate_on_corpus_change():
+    cache = ExplanationCache(LocalCacheBackend())
+    key = cache.key("sentence", "basic", "engineer", NERS)
+    cache.set(key, "explanation")
+    assert cache.get(cache.key("sentence", "basic", "engineer", NERS)) == "explanation"
+
+    cache.invalidate()
+    assert cache.get(cache.key("sentence", "basic", "engineer", NERS)) is None
+    assert cache.stats == {"hits": 1, "misses": 1, "corpus_version": 1}
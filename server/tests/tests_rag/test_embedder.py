@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+import pytest
+
+from app.rag import embedder as embedder_module
+from app.rag.embedder import Embedder, batch_by_tokens
+
+
+class WordEncoding:
+    """Stand-in for a tiktoken encoding that counts one token per word."""
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode_ordinary(text) for text in texts]
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+        self.dimensions = set()
+        self.lock = threading.Lock()
+
+    def create(self, input, model, dimensions=None):
+        with self.lock:
+            self.calls.append(list(input))
+            self.dimensions.add(dimensions)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+
+class AsyncFakeEmbeddings(FakeEmbeddings):
+    async def create(self, input, model, dimensions=None):
+        return super().create(input, model, dimensions)
+
+
+@pytest.fixture
+def embedder(monkeypatch) -> Embedder:
+    monkeypatch.setattr(embedder_module, "get_encoding", lambda model: WordEncoding())
+    embedder = Embedder(api_key="sk-test")
+    embedder.client = SimpleNamespace(embeddings=FakeEmbeddings())
+    embedder.async_client = SimpleNamespace(embeddings=AsyncFakeEmbeddings())
+    return embedder
+
+
+def test_batch_by_tokens_respects_input_limit():
+    assert batch_by_tokens([1] * 5, max_inputs=2, max_tokens=100) == [[0, 1], [2, 3], [4]]
+
+
+def test_batch_by_tokens_respects_token_limit():
+    assert batch_by_tokens([4, 4, 4, 9, 1], max_inputs=100, max_tokens=8) == [[0, 1], [2], [3], [4]]
+
+
+def test_embed_documents_batches_and_keeps_order(embedder: Embedder, monkeypatch):
+    monkeypatch.setattr(embedder_module, "EMBEDDING_BATCH_MAX_INPUTS", 3)
+    texts = [f"text number {'x' * i}" for i in range(10)]
+
+    embeddings = embedder.embed_documents(texts, max_concurrency=3)
+
+    assert embeddings == [[float(len(text))] for text in texts]
+    assert len(embedder.client.embeddings.calls) == 4
+    assert all(len(call) <= 3 for call in embedder.client.embeddings.calls)
+
+
+def test_embed_documents_empty(embedder: Embedder):
+    assert embedder.embed_documents([]) == []
+    assert embedder.client.embeddings.calls == []
+
+
+def test_embed_documents_only_requests_cache_misses(embedder: Embedder):
+    from app.rag.embedding_cache import EmbeddingCache
+    embedder.cache = EmbeddingCache(model=embedder.model, dimension=1)
+    embedder.cache.put("cached text", [42.0])
+
+    embeddings = embedder.embed_documents(["cached text", "new text", "new text"])
+
+    assert embeddings == [[42.0], [8.0], [8.0]]
+    assert embedder.client.embeddings.calls == [["new text"]]
+
+
+def test_aembed_batch_respects_request_limits(embedder: Embedder, monkeypatch):
+    monkeypatch.setattr(embedder_module, "EMBEDDING_BATCH_MAX_INPUTS", 3)
+    monkeypatch.setattr(embedder_module, "EMBEDDING_BATCH_MAX_TOKENS", 5)
+    texts = [f"text number {'x' * i}" for i in range(10)]
+
+    embeddings = asyncio.run(embedder.aembed_batch(texts, max_concurrency=2))
+
+    assert embeddings == [[float(len(text))] for text in texts]
+    calls = embedder.async_client.embeddings.calls
+    assert len(calls) == 9
+    assert all(len(call) <= 3 and sum(len(text.split()) for text in call) <= 5 for call in calls)
+    assert embedder.client.embeddings.calls == []
+
+
+def test_requests_the_configured_dimension(embedder: Embedder):
+    embedder.dimension = 256
+
+    embedder.embed_documents(["some text"])
+    asyncio.run(embedder.aembed_batch(["other text"]))
+
+    assert embedder.client.embeddings.dimensions == {256}
+    assert embedder.async_client.embeddings.dimensions == {256}
+
+
+def test_async_cache_access_stays_off_the_event_loop(embedder: Embedder):
+    from app.rag.embedding_cache import EmbeddingCache
+
+    class RecordingCache(EmbeddingCache):
+        threads = set()
+
+        def get(self, text):
+            self.threads.add(threading.get_ident())
+            return super().get(text)
+
+        def put(self, text, embedding):
+            self.threads.add(threading.get_ident())
+            super().put(text, embedding)
+
+    embedder.cache = RecordingCache(model=embedder.model, dimension=1)
+
+    async def run():
+        await embedder.aembed_text("some text")
+        await embedder.aembed_batch(["some text", "other text"])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert RecordingCache.threads and loop_thread not in RecordingCache.threads
@@ -0,0 +1,80 @@
+import pytest
+from app.rag.embedding_cache import EmbeddingCache, normalize_text
+
+
+def test_normalize_text():
+    assert normalize_text("  access \n point  ") == "access point"
+
+
+def test_memory_hit_and_miss_counters():
+    cache = EmbeddingCache(model="m", dimension=2)
+    assert cache.get("access point") is None
+    cache.put("access point", [0.5, 0.25])
+
+    assert cache.get("access  point") == [0.5, 0.25]
+    assert cache.stats["memory_hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_lru_eviction():
+    cache = EmbeddingCache(model="m", dimension=1, max_memory_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get("c") == [3.0]
+
+
+def test_key_depends_on_model_and_dimension():
+    assert EmbeddingCache(model="a", dimension=2).key("x") != EmbeddingCache(model="b", dimension=2).key("x")
+    assert EmbeddingCache(model="a", dimension=2).key("x") != EmbeddingCache(model="a", dimension=3).key("x")
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache = EmbeddingCache(model="m", dimension=3, cache_dir=str(tmp_path))
+    cache.put("first", [1.0, 2.0, 3.0])
+    cache.put("second", [4.0, 5.0, 6.0])
+
+    restarted = EmbeddingCache(model="m", dimension=3, cache_dir=str(tmp_path))
+    assert restarted.get("second") == [4.0, 5.0, 6.0]
+    assert restarted.get("first") == [1.0, 2.0, 3.0]
+    assert restarted.stats["disk_hits"] == 2
+    assert restarted.stats["disk_entries"] == 2
+
+
+def test_disk_tier_rejects_wrong_dimension(tmp_path):
+    cache = EmbeddingCache(model="m", dimension=3, cache_dir=str(tmp_path))
+    cache.put("short", [1.0])
+
+    # Still served from memory, but never persisted
+    assert cache.get("short") == [1.0]
+    assert cache.stats["disk_entries"] == 0
+
+
+def test_partially_written_vector_is_dropped(tmp_path):
+    cache = EmbeddingCache(model="m", dimension=2, cache_dir=str(tmp_path))
+    cache.put("kept", [1.0, 2.0])
+    with (tmp_path / "vectors-2.f32").open("ab") as f:
+        f.write(b"\0" * 3)
+
+    restarted = EmbeddingCache(model="m", dimension=2, cache_dir=str(tmp_path))
+    restarted.put("appended", [3.0, 4.0])
+
+    reopened = EmbeddingCache(model="m", dimension=2, cache_dir=str(tmp_path))
+    assert reopened.get("appended") == [3.0, 4.0]
+    assert reopened.get("kept") == [1.0, 2.0]
+
+
+def test_workers_sharing_the_directory(tmp_path):
+    first = EmbeddingCache(model="m", dimension=2, cache_dir=str(tmp_path))
+    second = EmbeddingCache(model="m", dimension=2, cache_dir=str(tmp_path))
+    first.put("a", [1.0, 1.0])
+    second.put("b", [2.0, 2.0])
+    first.put("c", [3.0, 3.0])
+
+    assert second.get("c") == [3.0, 3.0]
+    assert first.get("b") == [2.0, 2.0]
+    assert EmbeddingCache(model="m", dimension=2, cache_dir=str(tmp_path)).stats["disk_entries"] == 3
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from app.rag import rag as rag_module
+from app.rag.fusion import reciprocal_rank_fusion
+from app.data.vector import DocumentChunk
+
+
+def ranking(*ids):
+    return [{"id": record_id, "text": record_id} for record_id in ids]
+
+
+def test_results_in_both_rankings_come_first():
+    fused = reciprocal_rank_fusion([ranking("a", "b", "c"), ranking("c", "d")], k=60)
+
+    assert [record["id"] for record in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["fused_score"] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_ties_keep_first_ranking_order():
+    fused = reciprocal_rank_fusion([ranking("a", "b"), ranking("b", "a")])
+
+    assert [record["id"] for record in fused] == ["a", "b"]
+
+
+class FakeEmbedder:
+    model = "fake"
+
+    async def aembed_text(self, text):
+        return [1.0, 0.0, 0.0, 0.0]
+
+    async def aembed_batch(self, texts):
+        return [[1.0, 0.0, 0.0, 0.0] for _ in texts]
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_module, "VECTOR_BACKEND", "local")
+    monkeypatch.setattr(rag_module, "VECTOR_STORE_DIR", str(tmp_path / "vectors"))
+    monkeypatch.setattr(rag_module, "EMBEDDING_CACHE_DIR", "")
+    monkeypatch.setattr(rag_module, "HYBRID_RETRIEVAL_LIMIT", 2)
+    rag = rag_module.Rag(api_key="sk-test", embedder_dimension=4)
+    rag.embedder = FakeEmbedder()
+    # Generic chunks are closer to the query than the one naming the product
+    rag.vector_db.add_documents(
+        [DocumentChunk(text=f"Generic {i}", embedding=[1.0, 0.1 * i, 0.0, 0.0]) for i in range(1, 6)]
+        + [DocumentChunk(text="Netgear R7000 manual", named_entities=["R7000"], embedding=[0.5, 1.0, 0.0, 0.0])]
+    )
+    return rag
+
+
+def test_entities_pull_matching_chunks_into_smaller_context(rag):
+    assert asyncio.run(rag.asearch_context("Reset the router")) == [f"Generic {i}" for i in range(1, 6)]
+
+    contexts = asyncio.run(rag.asearch_context("Reset the R7000", entities=["R7000"]))
+
+    assert contexts == ["Netgear R7000 manual", "Generic 1"]
+
+
+def test_entities_can_arrive_while_embedding(rag):
+    async def pending_entities():
+        await asyncio.sleep(0)
+        return [["R7000"], []]
+
+    async def search():
+        return await rag.asearch_context_batch(["Reset the R7000", "Reset the router"], entities=pending_entities())
+
+    contexts = asyncio.run(search())
+
+    assert contexts == [["Netgear R7000 manual", "Generic 1"], [f"Generic {i}" for i in range(1, 6)]]
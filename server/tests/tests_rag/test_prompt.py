@@ -0,0 +1,48 @@
+import json
+from app.rag.prompt import build_prompt
+
+
+class WordEncoding:
+    """Stand-in tokenizer counting one token per whitespace-separated word."""
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def data_of(prompt):
+    return json.loads(prompt.text.split("\n")[1])
+
+
+def test_everything_fits_compactly():
+    prompt = build_prompt("Reset the AP", ["first source", "second source"], [("AP", "access point")], "basic", "sales",
+                          WordEncoding(), max_tokens=100)
+
+    assert prompt.text.startswith('Data:\n{"sources":["first source","second source"],"dictionary":[{"name":"AP","definition":"access point"}]}')
+    assert prompt.text.endswith("Sentences: Reset the AP\nDetails level: basic\n Role: sales")
+    assert (prompt.contexts_used, prompt.contexts_total, prompt.truncated) == (2, 2, False)
+    assert prompt.tokens == len(prompt.text.split())
+
+
+def test_lower_ranked_contexts_are_cut_to_budget():
+    contexts = [" ".join(["best"] * 30), " ".join(["second"] * 30), " ".join(["third"] * 30)]
+
+    prompt = build_prompt("Reset the AP", contexts, [("AP", "access point")], "basic", "sales",
+                          WordEncoding(), max_tokens=60, min_context_tokens=5)
+
+    sources = data_of(prompt)["sources"]
+    assert sources[0] == contexts[0]
+    assert sources[1].split() == ["second"] * len(sources[1].split())
+    assert 0 < len(sources[1].split()) < 30
+    assert data_of(prompt)["dictionary"] == [{"name": "AP", "definition": "access point"}]
+    assert (prompt.contexts_used, prompt.truncated) == (2, True)
+    assert prompt.tokens <= 60
+
+
+def test_short_fragments_are_dropped():
+    prompt = build_prompt("Reset the AP", [" ".join(["best"] * 30), " ".join(["second"] * 30)], [], "basic", "sales",
+                          WordEncoding(), max_tokens=45, min_context_tokens=5)
+
+    assert data_of(prompt)["sources"] == [" ".join(["best"] * 30)]
+    assert not prompt.truncated
@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from app.rag.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "explanation"
+
+        results = await asyncio.gather(*[flight.run("key", work) for _ in range(5)], flight.run("other", work))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+
+    assert results == ["explanation"] * 6
+    assert len(calls) == 2
+    assert flight.stats == {"executions": 2, "coalesced": 4, "in_flight": 0}
+
+
+def test_errors_are_shared_but_not_remembered():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = []
+
+        async def work():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            if len(attempts) == 1:
+                raise RuntimeError("upstream failed")
+            return "ok"
+
+        first = await asyncio.gather(flight.run("key", work), flight.run("key", work), return_exceptions=True)
+        second = await flight.run("key", work)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert [str(error) for error in first] == ["upstream failed"] * 2
+    assert second == "ok"
+
+
+def test_execution_is_cancelled_only_when_nobody_waits():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        release = asyncio.Event()
+        cancelled = []
+
+        async def work():
+            started.set()
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return "done"
+
+        first = asyncio.create_task(flight.run("key", work))
+        second = asyncio.create_task(flight.run("key", work))
+        await started.wait()
+
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not cancelled
+        release.set()
+        assert await second == "done"
+
+        release.clear()
+        third = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0)
+        third.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await third
+        await asyncio.sleep(0)
+        return cancelled, "key" in flight
+
+    cancelled, still_running = asyncio.run(scenario())
+
+    assert cancelled == [1]
+    assert not still_running
+
+
+def test_caller_after_the_last_one_gave_up_starts_afresh():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fast():
+            return "fresh"
+
+        first = asyncio.create_task(flight.run("key", slow))
+        await started.wait()
+        first.cancel()
+        # Joins while the cancelled execution has not finished yet
+        second = asyncio.create_task(flight.run("key", fast))
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, flight.stats
+
+    result, stats = asyncio.run(scenario())
+
+    assert result == "fresh"
+    assert stats == {"executions": 2, "coalesced": 0, "in_flight": 0}